@@ -0,0 +1,27 @@
+"""
+Benchmarks of `parse_data`: a cold import, a re-import of unchanged data, and a re-import after
+some cards have changed.
+"""
+from __future__ import division, print_function
+
+from magic_cards.models import Card, Printing
+from magic_cards.utils.import_cards import Everything, parse_data
+from magic_cards.utils.stats import ImportStats
+
+from .synthetic import change_cards, make_sets_data
+from .utils import report_import
+
+
+def benchmark_import(num_sets=40, cards_per_set=250, reprint_fraction=0.2, changed_fraction=0.05):
+    sets_data = make_sets_data(num_sets, cards_per_set, reprint_fraction=reprint_fraction)
+    changed_data = change_cards(sets_data, changed_fraction)
+
+    for label, data in [
+        ('cold import of {} sets'.format(num_sets), sets_data),
+        ('no-op re-import', sets_data),
+        ('re-import with {:.0%} of cards changed'.format(changed_fraction), changed_data),
+    ]:
+        stats = ImportStats(count_queries=True)
+        parse_data(data, Everything, stats=stats)
+        report_import(label, stats.as_dict(), num_sets * cards_per_set)
+    print('{} cards, {} printings'.format(Card.objects.count(), Printing.objects.count()))
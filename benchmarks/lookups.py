@@ -0,0 +1,50 @@
+"""
+Benchmarks of Printing lookups, with and without the indexes added in migration 0004.
+"""
+from __future__ import print_function
+
+import random
+
+from magic_cards.models import Printing
+from magic_cards.utils.import_cards import Everything, parse_data
+
+from .synthetic import make_sets_data
+from .utils import best_of, report, without_indexes
+
+# The columns of the Printing indexes added in migration 0004
+INDEXED_COLUMNS = [('multiverse_id',), ('set_id', 'number')]
+
+
+def benchmark_printing_lookups(num_sets=160, cards_per_set=250, num_lookups=200):
+    sets_data = make_sets_data(num_sets, cards_per_set)
+    parse_data(sets_data, Everything)
+    print('{} printings'.format(Printing.objects.count()))
+
+    rng = random.Random(0)
+    multiverse_ids = rng.sample(list(Printing.objects.values_list('multiverse_id', flat=True)), num_lookups)
+    set_numbers = rng.sample(list(Printing.objects.values_list('set_id', 'number')), num_lookups)
+
+    def by_multiverse_id():
+        for multiverse_id in multiverse_ids:
+            list(Printing.objects.filter(multiverse_id=multiverse_id))
+
+    def by_set_and_number():
+        for set_id, number in set_numbers:
+            list(Printing.objects.filter(set_id=set_id, number=number))
+
+    def reimport():
+        # Changing set-level data forces every set to be reconciled, while the cards are unchanged.
+        for data in sets_data.values():
+            data['releaseDate'] = str(rng.random())
+        parse_data(sets_data, Everything)
+
+    for label, func in [
+        ('{} lookups by multiverse_id'.format(num_lookups), by_multiverse_id),
+        ('{} lookups by (set, number)'.format(num_lookups), by_set_and_number),
+        ('re-import of {} sets'.format(num_sets), reimport),
+    ]:
+        with without_indexes(Printing, *INDEXED_COLUMNS):
+            before = best_of(func)
+        after = best_of(func)
+        report(label + ' (unindexed)', before)
+        report(label + ' (indexed)', after, baseline=before)
@@ -0,0 +1,21 @@
+# -*- coding: utf-8
+from __future__ import unicode_literals, absolute_import
+
+import os
+
+from tests.settings import *  # noqa
+
+DEBUG = False
+
+# Benchmarks run against SQLite by default. Point them at another database (e.g. PostgreSQL) with
+# the BENCHMARK_DB_* environment variables; a test database is created and destroyed as usual.
+DATABASES = {
+    "default": {
+        "ENGINE": os.environ.get("BENCHMARK_DB_ENGINE", "django.db.backends.sqlite3"),
+        "NAME": os.environ.get("BENCHMARK_DB_NAME", ":memory:"),
+        "USER": os.environ.get("BENCHMARK_DB_USER", ""),
+        "PASSWORD": os.environ.get("BENCHMARK_DB_PASSWORD", ""),
+        "HOST": os.environ.get("BENCHMARK_DB_HOST", ""),
+        "PORT": os.environ.get("BENCHMARK_DB_PORT", ""),
+    }
+}
@@ -0,0 +1,89 @@
+"""
+Generators of synthetic data in the shape of MTGJSON's AllSets file.
+"""
+import copy
+import random
+from collections import OrderedDict
+
+RARITIES = ['Mythic Rare'] + ['Rare'] * 3 + ['Uncommon'] * 4 + ['Common'] * 7
+TYPES = ['Artifact', 'Creature', 'Enchantment', 'Instant', 'Land', 'Sorcery']
+SUBTYPES = ['Elf', 'Goblin', 'Human', 'Warrior', 'Wizard', 'Zombie']
+
+
+def make_printing_data(rng, multiverse_id=None, number=''):
+    return {
+        'artist': 'Artist {}'.format(rng.randint(0, 500)),
+        'rarity': rng.choice(RARITIES),
+        'number': number,
+        'multiverseid': multiverse_id,
+    }
+
+
+def make_card_data(name, rng, multiverse_id=None, number=''):
+    types = [rng.choice(TYPES)]
+    card_data = {
+        'layout': 'normal',
+        'name': name,
+        'manaCost': '{{{}}}{{R}}'.format(rng.randint(0, 6)),
+        'text': 'When {} enters the battlefield, draw a card.'.format(name),
+        'types': types,
+        'flavor': 'Flavor text of {}.'.format(name),
+    }
+    card_data.update(make_printing_data(rng, multiverse_id, number))
+    if 'Creature' in types:
+        card_data['subtypes'] = rng.sample(SUBTYPES, 2)
+        card_data['power'] = str(rng.randint(0, 6))
+        card_data['toughness'] = str(rng.randint(1, 6))
+    return card_data
+
+
+def make_sets_data(num_sets, cards_per_set, reprint_fraction=0, seed=0):
+    """
+    Returns a dictionary of `num_sets` sets of `cards_per_set` cards each.
+
+    A `reprint_fraction` of each set's cards (after the first set) are reprints of cards from
+    earlier sets, and so already exist when the set is imported; the rest are new.
+    """
+    rng = random.Random(seed)
+    sets_data = OrderedDict()
+    printed = []
+    for set_index in range(num_sets):
+        code = 'S{:03d}'.format(set_index)
+        num_reprints = int(cards_per_set * reprint_fraction) if set_index else 0
+        reprints = rng.sample(printed, num_reprints)
+        cards = []
+        for i in range(cards_per_set):
+            multiverse_id, number = set_index * cards_per_set + i + 1, str(i + 1)
+            if i < num_reprints:
+                # Reprints share the card's rules, but not the printing's details.
+                card_data = dict(reprints[i], **make_printing_data(rng, multiverse_id, number))
+            else:
+                card_data = make_card_data('Card {}-{}'.format(code, i), rng, multiverse_id, number)
+            cards.append(card_data)
+        printed.extend(cards[num_reprints:])
+        sets_data[code] = {
+            'name': 'Synthetic Set {}'.format(set_index),
+            'code': code,
+            'cards': cards,
+        }
+    return sets_data
+
+
+def card_names(sets_data):
+    return {card_data['name'] for data in sets_data.values() for card_data in data['cards']}
+
+
+def change_cards(sets_data, changed_fraction, seed=0):
+    """
+    Returns a copy of `sets_data` in which the rules text of a `changed_fraction` of the distinct
+    cards has changed (in every set they appear in), as happens when MTGJSON issues errata.
+    """
+    rng = random.Random(seed)
+    names = sorted(card_names(sets_data))
+    changed = set(rng.sample(names, int(len(names) * changed_fraction)))
+    sets_data = copy.deepcopy(sets_data)
+    for data in sets_data.values():
+        for card_data in data['cards']:
+            if card_data['name'] in changed:
+                card_data['text'] += ' (Errata)'
+    return sets_data
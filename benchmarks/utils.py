@@ -0,0 +1,65 @@
+from __future__ import division, print_function
+
+import timeit
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+def best_of(func, repeat=3):
+    """
+    Returns the fastest of `repeat` timings of `func()`, in seconds.
+    """
+    return min(timeit.Timer(func).repeat(repeat=repeat, number=1))
+
+
+@contextmanager
+def without_indexes(model, *columns):
+    """
+    Temporarily drops the indexes of `model` on each of `columns`, tuples of column names, e.g. to
+    time a query without the indexes added by a migration. The indexes are recreated under the same
+    names afterwards.
+
+    Only the indexes themselves are dropped, so that the schema otherwise stays that of the latest
+    migration.
+    """
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    indexes = [
+        (name, constraint['columns']) for name, constraint in sorted(constraints.items())
+        if constraint['index'] and not constraint['unique'] and not constraint['primary_key'] and
+        tuple(constraint['columns']) in columns
+    ]
+    quote_name = connection.ops.quote_name
+    with connection.schema_editor() as schema_editor:
+        for name, _ in indexes:
+            schema_editor.execute(
+                schema_editor.sql_delete_index % {'table': quote_name(table), 'name': quote_name(name)})
+    try:
+        yield
+    finally:
+        with connection.schema_editor() as schema_editor:
+            for name, index_columns in indexes:
+                schema_editor.execute('CREATE INDEX {} ON {} ({})'.format(
+                    quote_name(name), quote_name(table), ', '.join(quote_name(column) for column in index_columns)))
+
+
+def report(label, seconds, baseline=None):
+    line = '  {:<40} {:>10.2f} ms'.format(label, seconds * 1000)
+    if baseline:
+        line += '  ({:.1f}x faster)'.format(baseline / seconds)
+    print(line)
+
+
+def report_import(label, stats, num_cards):
+    """
+    Reports the total time and queries per card of an import, given the dictionary returned by
+    `ImportStats.as_dict`, followed by the phases that took the most time.
+    """
+    total = stats['total']
+    print('  {:<40} {:>10.2f} ms  {:>6.3f} queries/card'.format(
+        label, total['time'] * 1000, total['queries'] / num_cards))
+    phases = sorted((phase for phase in stats if phase != 'total'), key=lambda phase: -stats[phase]['time'])
+    print('    ' + ', '.join(
+        '{} {:.0f} ms'.format(phase, stats[phase]['time'] * 1000) for phase in phases[:3]))
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8
+from __future__ import unicode_literals, absolute_import, print_function
+
+import importlib
+import os
+import sys
+
+import django
+
+BENCHMARK_MODULES = [
+    'benchmarks.imports',
+    'benchmarks.lookups',
+]
+
+
+def run_benchmarks(*names):
+    """
+    Runs every function named `benchmark_*` in `BENCHMARK_MODULES`, or only those named in `names`,
+    each against a fresh test database.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    django.setup()
+    from django.db import connection
+
+    for module_name in BENCHMARK_MODULES:
+        module = importlib.import_module(module_name)
+        for name in sorted(dir(module)):
+            if not name.startswith('benchmark_') or (names and name not in names):
+                continue
+            print('{} ({})'.format(name, connection.vendor))
+            old_name = connection.creation.create_test_db(verbosity=0)
+            try:
+                getattr(module, name)()
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    run_benchmarks(*sys.argv[1:])
@@ -1,11 +1,34 @@
 from django.contrib import admin
 
 from .models import Card, Set, Printing, CardSupertype, CardType, CardSubtype, Artist
+from .utils.pagination import EstimatedCountPaginator
+
+
+class SetCodeListFilter(admin.SimpleListFilter):
+    """
+    Filters by set code, listing only the code and name of each Set rather than loading every Set.
+    """
+    title = 'set'
+    parameter_name = 'set'
+
+    def lookups(self, request, model_admin):
+        return Set.objects.order_by('name').values_list('code', 'name')
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(set__code=self.value())
+        return queryset
 
 
 @admin.register(Card)
 class CardAdmin(admin.ModelAdmin):
-    search_fields = ['name']
+    search_fields = ['name', 'text']
+
+    def get_search_results(self, request, queryset, search_term):
+        # Search the full-text index of names and rules text instead of scanning every Card.
+        if not search_term:
+            return queryset, False
+        return queryset.search(search_term), False
 
 
 @admin.register(Set)
@@ -16,8 +39,19 @@ class SetAdmin(admin.ModelAdmin):
 
 @admin.register(Printing)
 class PrintingAdmin(admin.ModelAdmin):
-    search_fields = ['card__name']
-    list_filter = ['set']
+    # Search card names by prefix. On PostgreSQL (and MySQL), prefix searches can use an index on
+    # Card.name, where substring searches cannot: see migration 0007. SQLite still scans every Card,
+    # as it never uses an index for a case-insensitive LIKE with an ESCAPE clause.
+    search_fields = ['^card__name']
+    list_filter = [SetCodeListFilter]
+    list_select_related = ['card', 'set', 'artist']
+    raw_id_fields = ['card', 'set', 'artist']
+    paginator = EstimatedCountPaginator
+    # Don't count every Printing just to display the total next to filtered results.
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super(PrintingAdmin, self).get_queryset(request).with_related()
 
 
 @admin.register(Artist)
@@ -0,0 +1,14 @@
+from django.core.management import BaseCommand
+
+from magic_cards.utils.catalogue import dump_catalogue
+
+
+class Command(BaseCommand):
+    help = 'Writes every card and printing to a binary file that can be memory-mapped with CatalogueReader.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str)
+
+    def handle(self, *args, **options):
+        num_cards, num_printings = dump_catalogue(options['path'])
+        self.stdout.write("Wrote {} cards and {} printings to {}.".format(num_cards, num_printings, options['path']))
@@ -2,7 +2,9 @@ from django.core.management import BaseCommand
 import inflect
 
 from magic_cards.models import Card, Printing, Set
-from magic_cards.utils.import_cards import import_cards, Everything
+from magic_cards.utils.import_cards import diff_cards, import_cards, Everything
+from magic_cards.utils.sources import CachedHTTPSource, LocalSource
+from magic_cards.utils.stats import ImportStats
 
 
 class Command(BaseCommand):
@@ -10,6 +12,27 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('set_code', nargs='*', type=str)
+        parser.add_argument(
+            '--force', action='store_true', dest='force', default=False,
+            help='Re-import sets and cards even if their data has not changed since the last import.')
+        parser.add_argument(
+            '--workers', type=int, dest='workers', default=1,
+            help='Number of processes to parse the MTGJSON data with. The data is still written by a single process.')
+        parser.add_argument(
+            '--file', dest='file',
+            help='Import from a local copy of the zipped MTGJSON AllSets file instead of downloading it.')
+        parser.add_argument(
+            '--cache-dir', dest='cache_dir',
+            help='Keep the downloaded MTGJSON file in this directory, and only download it again once it changes.')
+        parser.add_argument(
+            '--per-set-transactions', action='store_true', dest='per_set_transactions', default=False,
+            help='Commit each set separately, so that an interrupted import can be resumed by running it again.')
+        parser.add_argument(
+            '--stats', action='store_true', dest='stats', default=False,
+            help='Print the time taken, queries run, and rows written by each phase of the import.')
+        parser.add_argument(
+            '--dry-run', action='store_true', dest='dry_run', default=False,
+            help='Report how many objects the import would create, update, and delete, without writing anything.')
 
     def handle(self, *args, **options):
         models_to_track = [Set, Card, Printing]
@@ -23,9 +46,35 @@ class Command(BaseCommand):
         else:
             set_string = 'all sets'
 
+        if options['file']:
+            source = LocalSource(options['file'])
+        elif options['cache_dir']:
+            source = CachedHTTPSource(options['cache_dir'])
+        else:
+            source = None
+
+        if options['dry_run']:
+            self.stdout.write(p.inflect("Beginning dry run of {}.".format(set_string)))
+            diff = diff_cards(
+                set_codes or Everything, force=options['force'], workers=options['workers'], source=source)
+            self.stdout.write("Dry run complete. Nothing was written.")
+            for model, counts in diff.items():
+                self.stdout.write(
+                    "{}: {created} to create, {updated} to update, {deleted} to delete.".format(
+                        model._meta.object_name, **counts))
+            return
+
         self.stdout.write(p.inflect("Beginning import of {}.".format(set_string)))
-        import_cards(set_codes or Everything)
+        stats = import_cards(
+            set_codes or Everything,
+            force=options['force'],
+            workers=options['workers'],
+            per_set_transactions=options['per_set_transactions'],
+            source=source,
+            stats=ImportStats(count_queries=options['stats']))
         self.stdout.write("Import complete.")
+        if options['stats']:
+            self.write_stats(stats)
 
         final = {model: model.objects.count() for model in models_to_track}
         status_strings = [
@@ -34,3 +83,9 @@ class Command(BaseCommand):
             for model in models_to_track
         ]
         self.stdout.write("Added {}.".format(p.join(status_strings)))
+
+    def write_stats(self, stats):
+        self.stdout.write("{:<10} {:>10} {:>8} {:>8}".format('Phase', 'Seconds', 'Queries', 'Rows'))
+        for phase, record in stats.items():
+            self.stdout.write("{:<10} {:>10.3f} {:>8} {:>8}".format(
+                phase, record['time'], record['queries'], record['rows']))
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-17 00:32
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('magic_cards', '0002_card_loyalty'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='data_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='set',
+            name='data_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+    ]
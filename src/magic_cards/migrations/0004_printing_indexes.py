@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-17 00:36
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('magic_cards', '0003_data_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='printing',
+            name='multiverse_id',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='printing',
+            index_together=set([('set', 'number')]),
+        ),
+    ]
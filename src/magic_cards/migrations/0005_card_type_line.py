@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-17 00:46
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def forget_set_hashes(apps, schema_editor):
+    # The new fields are filled in by the importer, which only revisits Sets whose data hash has
+    # changed. Clearing the hashes makes the next import refresh every Card.
+    Set = apps.get_model('magic_cards', 'Set')
+    Set.objects.update(data_hash='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('magic_cards', '0004_printing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='type_flags',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='type_line',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(forget_set_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# The DDL is written out here rather than imported from magic_cards.utils.search, so that what this
+# migration does never changes once it has been applied.
+
+
+def has_fts5(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX magic_cards_card_search ON magic_cards_card "
+            "USING GIN ((to_tsvector('english', \"name\" || ' ' || \"text\")))")
+    elif connection.vendor == 'sqlite' and has_fts5(connection):
+        schema_editor.execute('CREATE VIRTUAL TABLE magic_cards_card_fts USING fts5(name, text)')
+        schema_editor.execute(
+            'INSERT INTO magic_cards_card_fts (rowid, name, text) SELECT id, name, text FROM magic_cards_card')
+
+
+def drop_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS magic_cards_card_search')
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS magic_cards_card_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('magic_cards', '0005_card_type_line'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
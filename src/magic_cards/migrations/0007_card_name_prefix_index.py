@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# PostgreSQL runs `istartswith` lookups as `UPPER("name"::text) LIKE UPPER(%s)`, which neither the
+# index on Card.name nor its `_like` index can serve. An index on that same expression, with the
+# pattern operator class, serves the case-insensitive prefix searches of the Printing admin.
+INDEX_NAME = 'magic_cards_card_name_upper_like'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX {} ON magic_cards_card ((UPPER("name"::text)) text_pattern_ops)'.format(INDEX_NAME))
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS {}'.format(INDEX_NAME))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('magic_cards', '0006_card_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# Migration 0006 created a plain FTS5 table on SQLite, which only the importer kept up to date. This
+# replaces it with an external-content table over magic_cards_card, kept up to date by triggers
+# however Cards are written. Rows are removed from an external-content table by inserting the
+# 'delete' command along with the values they were indexed with.
+#
+# SQLite drops these triggers along with the Card table whenever a migration rebuilds it, so any
+# later migration that alters the Card table must create them again.
+TRIGGERS = [
+    'CREATE TRIGGER magic_cards_card_fts_insert AFTER INSERT ON magic_cards_card BEGIN '
+    'INSERT INTO magic_cards_card_fts (rowid, name, text) VALUES (new.id, new.name, new.text); END',
+
+    'CREATE TRIGGER magic_cards_card_fts_delete AFTER DELETE ON magic_cards_card BEGIN '
+    "INSERT INTO magic_cards_card_fts (magic_cards_card_fts, rowid, name, text) "
+    "VALUES ('delete', old.id, old.name, old.text); END",
+
+    'CREATE TRIGGER magic_cards_card_fts_update AFTER UPDATE OF name, text ON magic_cards_card BEGIN '
+    "INSERT INTO magic_cards_card_fts (magic_cards_card_fts, rowid, name, text) "
+    "VALUES ('delete', old.id, old.name, old.text); "
+    'INSERT INTO magic_cards_card_fts (rowid, name, text) VALUES (new.id, new.name, new.text); END',
+]
+TRIGGER_NAMES = ['magic_cards_card_fts_insert', 'magic_cards_card_fts_delete', 'magic_cards_card_fts_update']
+
+
+def has_fts5(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def add_triggers(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite' or not has_fts5(connection):
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS magic_cards_card_fts')
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE magic_cards_card_fts USING fts5("
+        "name, text, content='magic_cards_card', content_rowid='id')")
+    schema_editor.execute("INSERT INTO magic_cards_card_fts (magic_cards_card_fts) VALUES ('rebuild')")
+    for sql in TRIGGERS:
+        schema_editor.execute(sql)
+
+
+def remove_triggers(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite' or not has_fts5(connection):
+        return
+    for name in TRIGGER_NAMES:
+        schema_editor.execute('DROP TRIGGER IF EXISTS {}'.format(name))
+    schema_editor.execute('DROP TABLE IF EXISTS magic_cards_card_fts')
+    schema_editor.execute('CREATE VIRTUAL TABLE magic_cards_card_fts USING fts5(name, text)')
+    schema_editor.execute(
+        'INSERT INTO magic_cards_card_fts (rowid, name, text) SELECT id, name, text FROM magic_cards_card')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('magic_cards', '0007_card_name_prefix_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_triggers, remove_triggers),
+    ]
@@ -1,11 +1,69 @@
 from __future__ import unicode_literals
 
 import random
+import re
+import time
+from array import array
+from collections import OrderedDict
 
 from django.db import models
 from django.utils.encoding import python_2_unicode_compatible
+from django.utils.six.moves import range
 from django_light_enums import enum
 
+from magic_cards.utils.search import search_cards
+
+try:
+    from django.core.exceptions import EmptyResultSet
+except ImportError:  # Django < 1.11
+    from django.db.models.sql.datastructures import EmptyResultSet
+
+# Bits of Card.type_flags for each supertype and type printed on real cards. Only ever append to this
+# list, as the position of each name is stored in the database.
+TYPE_FLAG_NAMES = [
+    'Basic', 'Legendary', 'Ongoing', 'Snow', 'World',
+    'Artifact', 'Conspiracy', 'Creature', 'Enchantment', 'Instant', 'Land', 'Phenomenon', 'Plane',
+    'Planeswalker', 'Scheme', 'Sorcery', 'Tribal', 'Vanguard',
+]
+TYPE_FLAGS = {name: 1 << i for i, name in enumerate(TYPE_FLAG_NAMES)}
+
+# Characters with a special meaning in the regular expressions of every supported database.
+_REGEX_SPECIAL_RE = re.compile(r'([\\.^$|?*+()\[\]{}])')
+
+# In-process cache of Printing ids, keyed by the query they were read from, in order of last use. See
+# PrintingQuerySet.id_index.
+_id_index_cache = OrderedDict()
+ID_INDEX_CACHE_SIZE = 128
+ID_INDEX_TIMEOUT = 300
+
+
+def clear_id_index_cache():
+    """
+    Discards every Printing id index cached by this process. Called once an import has been committed.
+    """
+    _id_index_cache.clear()
+
+
+def make_type_line(supertypes, types, subtypes):
+    """
+    Returns the type line of a card with the given lists of type names, with an em dash between
+    the types and subtypes as printed on the card.
+    """
+    type_line = ' '.join(list(supertypes) + list(types))
+    if subtypes:
+        type_line += ' \u2014 ' + ' '.join(subtypes)
+    return type_line
+
+
+def make_type_flags(names):
+    """
+    Returns the `TYPE_FLAGS` of the supertypes and types in `names` combined. Names without a flag are ignored.
+    """
+    flags = 0
+    for name in names:
+        flags |= TYPE_FLAGS.get(name, 0)
+    return flags
+
 
 @python_2_unicode_compatible
 class NameMixin(object):
@@ -13,6 +71,51 @@ class NameMixin(object):
         return self.name
 
 
+class CardQuerySet(models.QuerySet):
+    def of_type(self, *names):
+        """
+        Returns the Cards that have every one of the supertypes, types, and subtypes in `names`.
+
+        Names in `TYPE_FLAGS` are matched against `type_flags`, and the rest as whole words of
+        `type_line`, so the type tables are never joined. Names are case-sensitive on every database,
+        as in `Snapshot.of_type`. Neither the bitwise test nor the whole-word match can use an index,
+        so this scans the Card table, though without joining any other.
+        """
+        queryset = self
+        mask = make_type_flags(names)
+        if mask:
+            queryset = queryset.annotate(matched_type_flags=models.F('type_flags').bitand(mask)).filter(
+                matched_type_flags=mask)
+        for name in names:
+            if name not in TYPE_FLAGS:
+                # LIKE ignores case on SQLite only, whereas regular expressions respect it everywhere.
+                pattern = '(^| ){}( |$)'.format(_REGEX_SPECIAL_RE.sub(r'\\\1', name))
+                queryset = queryset.filter(type_line__regex=pattern)
+        return queryset
+
+    def search(self, query):
+        """
+        Returns the Cards whose name or rules text contains every word of `query`, using the
+        database's full-text search index where there is one (see `magic_cards.utils.search`).
+        """
+        return search_cards(self, query)
+
+    def with_related(self):
+        """
+        Prefetches the supertypes, types, and subtypes of the Cards, so that listing them does not
+        cost queries per Card.
+        """
+        return self.prefetch_related('supertypes', 'types', 'subtypes')
+
+    def for_display(self):
+        """
+        Prefetches everything needed to display the Cards in full: their types, as well as their
+        Printings (ordered by set and collector number) along with the set and artist of each.
+        """
+        printings = Printing.objects.with_related().order_by('set__code', 'number', 'id')
+        return self.with_related().prefetch_related(models.Prefetch('printings', queryset=printings))
+
+
 class Card(NameMixin, models.Model):
     name = models.CharField(max_length=255, unique=True)
     mana_cost = models.CharField(max_length=63, blank=True)
@@ -21,23 +124,150 @@ class Card(NameMixin, models.Model):
     types = models.ManyToManyField('CardType')
     subtypes = models.ManyToManyField('CardSubtype')
 
+    # Denormalized from the supertypes, types, and subtypes above by the importer, so that Cards can
+    # be filtered by type without joins (see CardQuerySet.of_type).
+    type_line = models.CharField(max_length=255, blank=True, db_index=True, editable=False)
+    type_flags = models.IntegerField(default=0, editable=False)
+
     text = models.TextField(blank=True)
     power = models.CharField(max_length=7, blank=True)
     toughness = models.CharField(max_length=7, blank=True)
     loyalty = models.SmallIntegerField(blank=True, null=True)
 
+    # Hash of the MTGJSON data this Card was last imported from, used to skip unchanged Cards.
+    data_hash = models.CharField(max_length=40, blank=True, editable=False)
+
+    objects = CardQuerySet.as_manager()
+
 
 class Set(NameMixin, models.Model):
     name = models.CharField(max_length=63, unique=True)
     code = models.CharField(max_length=8, unique=True)
 
+    # Hash of the MTGJSON data this Set was last imported from, used to skip unchanged Sets.
+    data_hash = models.CharField(max_length=40, blank=True, editable=False)
+
 
 class PrintingQuerySet(models.QuerySet):
-    def random(self, num):
+    # Upper bound on the number of candidate ids probed in a single query.
+    SAMPLE_BATCH_SIZE = 500
+
+    def random(self, num, cached=False):
+        """
+        Returns a queryset of `num` distinct Printings chosen uniformly at random from this queryset.
+        """
+        return self.filter(id__in=self.random_ids(num, cached=cached))
+
+    def with_related(self):
+        """
+        Joins in the Card, Set, and Artist of the Printings, which their `__str__` and most displays of
+        them use, so that listing them costs a single query.
+        """
+        return self.select_related('card', 'set', 'artist')
+
+    def for_display(self):
+        """
+        Like `with_related`, but also prefetches the supertypes, types, and subtypes of the Cards.
+        """
+        return self.with_related().prefetch_related('card__supertypes', 'card__types', 'card__subtypes')
+
+    def id_index(self, refresh=False):
+        """
+        Returns a compact array of the ids in this queryset, in ascending order.
+
+        The array is cached in-process, keyed by the SQL behind the queryset, so repeating the same
+        filter (e.g. set and rarity) does not query the database again. Cached arrays are tagged with
+        the shared cache version of `magic_cards.utils.cache`, which `import_cards` bumps once it
+        completes, so every process discards them after an import. They are also reread once they are
+        `ID_INDEX_TIMEOUT` seconds old, or if `refresh` is set. At most `ID_INDEX_CACHE_SIZE` arrays
+        are kept, discarding the least recently used first.
+        """
+        # The cache module imports the models, so it cannot be imported before they are defined.
+        from magic_cards.utils.cache import get_cache_version
+
+        queryset = self.order_by('id').values_list('id', flat=True)
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return array('i')
+        key = (self.db, sql, tuple(params))
+        version = get_cache_version()
+        entry = _id_index_cache.pop(key, None)
+        if refresh or entry is None or entry[0] != version or time.time() - entry[1] > ID_INDEX_TIMEOUT:
+            # AutoField ids are 32-bit integers on every supported database.
+            entry = (version, time.time(), array('i', queryset))
+        # Reinsert the entry to mark it as the most recently used.
+        _id_index_cache[key] = entry
+        while len(_id_index_cache) > ID_INDEX_CACHE_SIZE:
+            _id_index_cache.popitem(last=False)
+        return entry[2]
+
+    def random_ids(self, num, cached=False):
+        """
+        Returns a list of `num` distinct ids chosen uniformly at random from this queryset.
+
+        If `cached` is set, the ids are drawn from the queryset's cached `id_index`. Otherwise, rather
+        than counting or loading every id, this probes random candidate ids from the range between the
+        smallest and largest id, in batches of at most `SAMPLE_BATCH_SIZE`, and keeps those present in
+        the queryset. The density of the queryset within that range is estimated from the hit rate of
+        the probes so far. Only a filtered queryset so sparse that probing would cost more than reading
+        its ids has them read instead.
+        """
         num = int(num)
-        printing_ids = set(self.values_list('id', flat=True))
-        random_ids = random.sample(printing_ids, num)
-        return self.filter(id__in=random_ids)
+        if cached:
+            ids = self.id_index()
+            return [ids[i] for i in random.sample(range(len(ids)), num)]
+
+        if num < 0:
+            raise ValueError("Sample larger than population or is negative")
+        if num == 0:
+            return []
+        bounds = self.aggregate(min_id=models.Min('id'), max_id=models.Max('id'))
+        if bounds['min_id'] is None or num > bounds['max_id'] - bounds['min_id'] + 1:
+            raise ValueError("Sample larger than population or is negative")
+
+        chosen = set()
+        probed = set()
+        hits = 0
+        id_range = bounds['max_id'] - bounds['min_id'] + 1
+        while len(chosen) < num:
+            untried = id_range - len(probed)
+            if not untried:
+                raise ValueError("Sample larger than population or is negative")
+            needed = num - len(chosen)
+            # Assume the range is dense until the first probes say otherwise, and oversample to
+            # make up for gaps in it.
+            density = float(hits) / len(probed) if hits else 1.0 / (len(probed) + 1)
+            size = min(int(needed / density * 1.5) + 1, untried)
+            if self.query.where and size > density * id_range:
+                # The ids of a filtered queryset are estimated to be fewer than the probes needed to find them.
+                remaining = [pk for pk in self.values_list('id', flat=True) if pk not in chosen]
+                chosen.update(random.sample(remaining, needed))
+                break
+
+            candidates = _draw_untried(bounds['min_id'], bounds['max_id'], probed, size)
+            probed.update(candidates)
+            found = []
+            for i in range(0, len(candidates), self.SAMPLE_BATCH_SIZE):
+                found.extend(self.filter(id__in=candidates[i:i + self.SAMPLE_BATCH_SIZE]).values_list('id', flat=True))
+            hits += len(found)
+            random.shuffle(found)
+            chosen.update(found[:needed])
+        return list(chosen)
+
+
+def _draw_untried(low, high, probed, size):
+    """
+    Returns `size` distinct ids chosen at random from `low` to `high` inclusive, excluding `probed`.
+    """
+    untried = high - low + 1 - len(probed)
+    if untried <= 2 * size:
+        return random.sample([pk for pk in range(low, high + 1) if pk not in probed], size)
+    candidates = set()
+    while len(candidates) < size:
+        candidates.update(
+            pk for pk in random.sample(range(low, high + 1), size - len(candidates)) if pk not in probed)
+    return list(candidates)
 
 
 @python_2_unicode_compatible
@@ -58,7 +288,10 @@ class Printing(models.Model):
     flavor_text = models.TextField(blank=True)
     artist = models.ForeignKey('Artist', related_name='printings')
     number = models.CharField(max_length=7, blank=True)
-    multiverse_id = models.PositiveIntegerField(blank=True, null=True)
+    multiverse_id = models.PositiveIntegerField(blank=True, null=True, db_index=True)
+
+    class Meta:
+        index_together = [('set', 'number')]
 
     @property
     def image_url(self):
@@ -0,0 +1,8 @@
+from django.dispatch import Signal
+
+# Sent by `import_cards` before an import begins, with the argument `set_codes`.
+import_started = Signal()
+
+# Sent by `import_cards` once an import has finished, with the arguments `set_codes` and
+# `stats`, the dictionary of per-phase timings, query counts, and row counts it returns.
+import_finished = Signal()
@@ -0,0 +1,104 @@
+from __future__ import absolute_import
+
+import random
+from collections import Counter
+
+from magic_cards.models import Printing
+from magic_cards.utils.random import WeightedSampler
+
+Rarity = Printing.Rarity
+
+# Each slot of a pack is a dictionary of rarities and their weights. This layout is that of a modern
+# 15-card booster: one rare (upgraded to a mythic rare one time in eight), three uncommons, ten
+# commons, and a basic land.
+DEFAULT_LAYOUT = (
+    [{Rarity.MYTHIC: 1, Rarity.RARE: 7}] +
+    [{Rarity.UNCOMMON: 1}] * 3 +
+    [{Rarity.COMMON: 1}] * 10 +
+    [{Rarity.BASIC_LAND: 1}]
+)
+
+# Rarities to use instead of those a set does not have (e.g. mythic rares before Shards of Alara).
+FALLBACK_RARITIES = {
+    Rarity.MYTHIC: Rarity.RARE,
+    Rarity.BASIC_LAND: Rarity.COMMON,
+}
+
+# Above this many distinct Printings, the whole set is fetched rather than each Printing by id.
+MAX_LOOKUP_IDS = 500
+
+
+def _slot_weights(slot, buckets):
+    """
+    Returns the weights of `slot`, moving the weight of any rarity without Printings in `buckets`
+    to its fallback rarity.
+    """
+    weights = {}
+    for rarity, weight in slot.items():
+        while rarity is not None and not buckets[rarity]:
+            rarity = FALLBACK_RARITIES.get(rarity)
+        if rarity is not None:
+            weights[rarity] = weights.get(rarity, 0) + weight
+    return weights
+
+
+def _draw_packs(buckets, slots, count, rng):
+    """
+    Returns `count` packs of ids drawn from `buckets`, with the rarity of each slot chosen by the
+    samplers of `slots`.
+    """
+    packs = []
+    for _ in range(count):
+        slot_rarities = [sampler.choice() for sampler in slots]
+        drawn = {}
+        for rarity, needed in Counter(slot_rarities).items():
+            bucket = buckets[rarity]
+            indices = rng.sample(range(len(bucket)), min(needed, len(bucket)))
+            indices += [rng.randrange(len(bucket)) for _ in range(needed - len(indices))]
+            drawn[rarity] = [bucket[i] for i in indices]
+        packs.append([drawn[rarity].pop() for rarity in slot_rarities])
+    return packs
+
+
+def generate_boosters(set_code, count=1, layout=DEFAULT_LAYOUT, rng=None):
+    """
+    Generates `count` booster packs of the Set with code `set_code`.
+
+    Returns a list of packs, each of which is a list of Printings in the order of the slots of
+    `layout`. A pack never contains the same Printing twice unless the set is too small to fill
+    it otherwise.
+
+    The candidate ids for each rarity are read from `PrintingQuerySet.id_index`, so they cost at
+    most one query per rarity and none once cached; all chosen Printings are then fetched in a
+    single query. The number of queries therefore does not depend on `count`.
+
+    If any chosen Printing has since been deleted, the cached ids are stale: they are reread and
+    the packs drawn again. Printings deleted while that happens are left out of their packs.
+    """
+    rng = rng or random
+    queryset = Printing.objects.filter(set__code=set_code)
+    rarities = {rarity for slot in layout for rarity in slot} | set(FALLBACK_RARITIES.values())
+    refresh = False
+    for _ in range(2):
+        buckets = {rarity: queryset.filter(rarity=rarity).id_index(refresh=refresh) for rarity in rarities}
+
+        slots = []
+        for slot in layout:
+            weights = _slot_weights(slot, buckets)
+            if not weights:
+                raise ValueError("Set {} has no printings to fill a {} slot.".format(
+                    set_code, '/'.join(Rarity.get_name(rarity) for rarity in slot)))
+            slots.append(WeightedSampler(weights, rng=rng))
+        packs = _draw_packs(buckets, slots, count, rng)
+
+        chosen_ids = {printing_id for pack in packs for printing_id in pack}
+        printings_queryset = queryset.select_related('card', 'set')
+        if len(chosen_ids) > MAX_LOOKUP_IDS:
+            # in_bulk() without a list of ids requires Django 1.10.
+            printings = {printing.pk: printing for printing in printings_queryset}
+        else:
+            printings = printings_queryset.in_bulk(list(chosen_ids))
+        if chosen_ids.issubset(printings):
+            break
+        refresh = True
+    return [[printings[printing_id] for printing_id in pack if printing_id in printings] for pack in packs]
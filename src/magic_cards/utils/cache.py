@@ -0,0 +1,135 @@
+"""
+A read-through cache of Cards with their types and Printings, for rendering cards without queries.
+
+Bundles are stored through Django's cache framework, in the cache named by the
+`MAGIC_CARDS_CACHE_ALIAS` setting (by default, 'default') for `MAGIC_CARDS_CACHE_TIMEOUT` seconds
+(by default, the cache's own timeout). Their keys are versioned, and `import_cards` bumps the
+version once it completes, so that every bundle cached before the import is ignored from then on.
+Changes made outside of the importer are not seen until the version is bumped. The same version
+also invalidates the Printing id indexes each process caches (see `PrintingQuerySet.id_index`).
+"""
+from __future__ import absolute_import
+
+import hashlib
+import random
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+from magic_cards.models import Card
+
+VERSION_KEY = 'magic_cards:version'
+BUNDLE_KEY_PREFIX = 'magic_cards:card:'
+
+
+def get_cache():
+    return caches[getattr(settings, 'MAGIC_CARDS_CACHE_ALIAS', DEFAULT_CACHE_ALIAS)]
+
+
+def _new_version():
+    # If the version is ever evicted, start again from a version that is all but certain not to have
+    # been used before.
+    return random.getrandbits(48)
+
+
+def get_cache_version():
+    """
+    Returns the current version of the keys of cached bundles.
+    """
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _new_version(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_cache_version():
+    """
+    Invalidates every cached bundle at once, by moving on to a new version of their keys.
+    """
+    cache = get_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, _new_version(), timeout=None)
+
+
+def bundle_key(name):
+    # Hash the name, as some cache backends restrict the characters and length of keys.
+    return BUNDLE_KEY_PREFIX + hashlib.sha1(name.encode('utf-8')).hexdigest()
+
+
+def build_card_bundles(names):
+    """
+    Returns a dictionary mapping each of `names` that is the name of a Card to its bundle, built
+    from the database with a constant number of queries.
+
+    A bundle is a dictionary of plain values: the fields of the Card, the names of its supertypes,
+    types, and subtypes, and a list of its Printings along with their set and artist.
+    """
+    bundles = {}
+    for card in Card.objects.filter(name__in=list(names)).for_display():
+        bundles[card.name] = {
+            'id': card.id,
+            'name': card.name,
+            'mana_cost': card.mana_cost,
+            'type_line': card.type_line,
+            'supertypes': [obj.name for obj in card.supertypes.all()],
+            'types': [obj.name for obj in card.types.all()],
+            'subtypes': [obj.name for obj in card.subtypes.all()],
+            'text': card.text,
+            'power': card.power,
+            'toughness': card.toughness,
+            'loyalty': card.loyalty,
+            'printings': [
+                {
+                    'id': printing.id,
+                    'set_code': printing.set.code,
+                    'set_name': printing.set.name,
+                    'rarity': printing.rarity,
+                    'flavor_text': printing.flavor_text,
+                    'artist': printing.artist.full_name,
+                    'number': printing.number,
+                    'multiverse_id': printing.multiverse_id,
+                    'image_url': printing.image_url,
+                }
+                for printing in card.printings.all()
+            ],
+        }
+    return bundles
+
+
+def get_card_bundles(names):
+    """
+    Returns a dictionary mapping each of `names` that is the name of a Card to its bundle (see
+    `build_card_bundles`).
+
+    Bundles are read from the cache in one round trip, and only those missing from it are built from
+    the database and cached. Cached bundles therefore cost no queries at all.
+    """
+    names = list(names)
+    cache = get_cache()
+    version = get_cache_version()
+    keys = {bundle_key(name): name for name in names}
+    bundles = {keys[key]: bundle for key, bundle in cache.get_many(list(keys), version=version).items()}
+
+    missing = [name for name in names if name not in bundles]
+    if missing:
+        built = build_card_bundles(missing)
+        timeout = getattr(settings, 'MAGIC_CARDS_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+        cache.set_many({bundle_key(name): bundle for name, bundle in built.items()}, timeout=timeout, version=version)
+        bundles.update(built)
+    return bundles
+
+
+def get_card_bundle(name):
+    """
+    Returns the bundle of the Card named `name` (see `build_card_bundles`), from the cache if
+    possible. Raises `Card.DoesNotExist` if there is no such Card.
+    """
+    bundle = get_card_bundles([name]).get(name)
+    if bundle is None:
+        raise Card.DoesNotExist("Card matching name {!r} does not exist.".format(name))
+    return bundle
@@ -0,0 +1,251 @@
+"""
+A column-oriented binary file of every Card and Printing, which many processes can memory-map and
+share through the operating system's page cache instead of each loading the catalogue themselves.
+
+The file is laid out as follows, with every integer a little-endian, 32-bit signed integer:
+
+- A header of the magic bytes `MAGIC`, the format version, and the number of strings, Cards, and
+  Printings.
+- The offsets of the strings in the string heap, one more than there are strings, so that string
+  `i` spans bytes `offsets[i]` to `offsets[i + 1]` of the heap.
+- One column per field of `CARD_COLUMNS`, with a value per Card; Cards are sorted by the UTF-8
+  bytes of their names. String fields hold the index of a string, and null integers `NULL`.
+- One column per field of `PRINTING_COLUMNS`, with a value per Printing; Printings are sorted by
+  Card id.
+- The string heap: every distinct string, UTF-8 encoded, back to back.
+
+`CatalogueReader` reads individual values straight from the mapped file, so opening a catalogue
+costs next to nothing and untouched rows are never read.
+"""
+import bisect
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import namedtuple
+
+from django.utils.six.moves import range
+
+from magic_cards.models import Card, Printing
+
+MAGIC = b'MTGCARDS'
+FORMAT_VERSION = 1
+NULL = -2 ** 31
+
+HEADER = struct.Struct('<8siiii')
+INT = struct.Struct('<i')
+
+INT_FIELD, STRING_FIELD = 'int', 'string'
+CARD_COLUMNS = [
+    ('id', INT_FIELD),
+    ('name', STRING_FIELD),
+    ('mana_cost', STRING_FIELD),
+    ('type_line', STRING_FIELD),
+    ('type_flags', INT_FIELD),
+    ('text', STRING_FIELD),
+    ('power', STRING_FIELD),
+    ('toughness', STRING_FIELD),
+    ('loyalty', INT_FIELD),
+]
+PRINTING_COLUMNS = [
+    ('id', INT_FIELD),
+    ('card_id', INT_FIELD),
+    ('set_code', STRING_FIELD),
+    ('set_name', STRING_FIELD),
+    ('rarity', INT_FIELD),
+    ('artist', STRING_FIELD),
+    ('number', STRING_FIELD),
+    ('multiverse_id', INT_FIELD),
+    ('flavor_text', STRING_FIELD),
+]
+# The ORM lookups of PRINTING_COLUMNS
+PRINTING_LOOKUPS = [
+    'id', 'card_id', 'set__code', 'set__name', 'rarity', 'artist__full_name', 'number', 'multiverse_id',
+    'flavor_text',
+]
+
+CardRow = namedtuple('CardRow', [name for name, _ in CARD_COLUMNS])
+PrintingRow = namedtuple('PrintingRow', [name for name, _ in PRINTING_COLUMNS])
+
+
+def _to_bytes(values):
+    column = array('i', values)
+    # Arrays are in the machine's byte order.
+    if sys.byteorder != 'little':
+        column.byteswap()
+    # array.tostring is called tobytes on Python 3.
+    return column.tobytes() if hasattr(column, 'tobytes') else column.tostring()
+
+
+def write_catalogue(f):
+    """
+    Writes every Card and Printing to the binary file object `f`. Returns the number of Cards and
+    Printings written.
+    """
+    strings = {}
+
+    def string_index(value):
+        return strings.setdefault(value.encode('utf-8'), len(strings))
+
+    def encode(rows, columns):
+        encoded = [[] for _ in columns]
+        for row in rows:
+            for values, value, (_, kind) in zip(encoded, row, columns):
+                if kind == STRING_FIELD:
+                    values.append(string_index(value))
+                else:
+                    values.append(NULL if value is None else value)
+        return encoded
+
+    # Sort by the encoded names rather than in the database, whose collation may differ.
+    cards = sorted(
+        Card.objects.values_list(*[name for name, _ in CARD_COLUMNS]), key=lambda row: row[1].encode('utf-8'))
+    printings = Printing.objects.order_by('card_id', 'id').values_list(*PRINTING_LOOKUPS)
+    card_columns = encode(cards, CARD_COLUMNS)
+    printing_columns = encode(printings, PRINTING_COLUMNS)
+    num_printings = len(printing_columns[0])
+
+    heap = sorted(strings, key=strings.get)
+    offsets = [0]
+    for value in heap:
+        offsets.append(offsets[-1] + len(value))
+
+    f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(heap), len(cards), num_printings))
+    f.write(_to_bytes(offsets))
+    for column in card_columns + printing_columns:
+        f.write(_to_bytes(column))
+    for value in heap:
+        f.write(value)
+    return len(cards), num_printings
+
+
+def dump_catalogue(path):
+    """
+    Writes every Card and Printing to the file at `path` (see `write_catalogue`).
+
+    The file is written under a temporary name and then renamed into place, so that processes which
+    have the previous version mapped keep reading it intact.
+    """
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as f:
+        counts = write_catalogue(f)
+    getattr(os, 'replace', os.rename)(temporary_path, path)
+    return counts
+
+
+class CatalogueReader(object):
+    """
+    Reads a catalogue written by `write_catalogue` from the memory-mapped file at `path`.
+
+    Cards and Printings are looked up by row index, or by name and Card id respectively, and
+    returned as CardRows and PrintingRows decoded from the mapped file on demand.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, num_strings, self.num_cards, self.num_printings = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("{} is not a card catalogue.".format(path))
+        if version != FORMAT_VERSION:
+            raise ValueError("Unsupported catalogue format version {}.".format(version))
+
+        self.offsets_start = HEADER.size
+        position = self.offsets_start + INT.size * (num_strings + 1)
+        self.card_columns = {}
+        for name, _ in CARD_COLUMNS:
+            self.card_columns[name] = position
+            position += INT.size * self.num_cards
+        self.printing_columns = {}
+        for name, _ in PRINTING_COLUMNS:
+            self.printing_columns[name] = position
+            position += INT.size * self.num_printings
+        self.heap_start = position
+
+    def close(self):
+        self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.num_cards
+
+    def _int(self, column_start, i):
+        return INT.unpack_from(self.buffer, column_start + INT.size * i)[0]
+
+    def _string_bytes(self, index):
+        start = self._int(self.offsets_start, index)
+        end = self._int(self.offsets_start, index + 1)
+        return self.buffer[self.heap_start + start:self.heap_start + end]
+
+    def _row(self, row_class, columns, starts, i):
+        values = []
+        for name, kind in columns:
+            value = self._int(starts[name], i)
+            if kind == STRING_FIELD:
+                value = self._string_bytes(value).decode('utf-8')
+            elif value == NULL:
+                value = None
+            values.append(value)
+        return row_class(*values)
+
+    def card(self, i):
+        """
+        Returns the CardRow of the `i`-th Card, in order of name.
+        """
+        if not 0 <= i < self.num_cards:
+            raise IndexError("Card index out of range.")
+        return self._row(CardRow, CARD_COLUMNS, self.card_columns, i)
+
+    def printing(self, i):
+        """
+        Returns the PrintingRow of the `i`-th Printing, in order of Card id.
+        """
+        if not 0 <= i < self.num_printings:
+            raise IndexError("Printing index out of range.")
+        return self._row(PrintingRow, PRINTING_COLUMNS, self.printing_columns, i)
+
+    def cards(self):
+        for i in range(self.num_cards):
+            yield self.card(i)
+
+    def find_card(self, name):
+        """
+        Returns the CardRow of the Card named `name`, or None, with a binary search over names.
+        """
+        names = _Column(self.num_cards, lambda i: self._string_bytes(self._int(self.card_columns['name'], i)))
+        target = name.encode('utf-8')
+        i = bisect.bisect_left(names, target)
+        if i < self.num_cards and names[i] == target:
+            return self.card(i)
+        return None
+
+    def printings_of(self, card_id):
+        """
+        Returns the PrintingRows of the Card with id `card_id`.
+        """
+        card_ids = _Column(self.num_printings, lambda i: self._int(self.printing_columns['card_id'], i))
+        start = bisect.bisect_left(card_ids, card_id)
+        end = bisect.bisect_right(card_ids, card_id, start)
+        return [self.printing(i) for i in range(start, end)]
+
+
+class _Column(object):
+    """
+    A read-only sequence over `length` values computed by `get`, for bisecting the mapped file.
+    """
+
+    def __init__(self, length, get):
+        self.length = length
+        self.get = get
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        return self.get(i)
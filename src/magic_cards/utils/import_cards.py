@@ -1,15 +1,33 @@
+import hashlib
 import io
 import json
+import multiprocessing
+import sys
 import zipfile
-from contextlib import closing
+from collections import Counter, OrderedDict
+from itertools import islice
 
-import requests
+import django
 from django.db import transaction
+from django.db.models import Count
 
-from magic_cards.models import Artist, Card, CardSubtype, CardSupertype, CardType, Printing, Set
+from magic_cards.models import (
+    Artist, Card, CardSubtype, CardSupertype, CardType, Printing, Set, clear_id_index_cache, make_type_flags,
+    make_type_line)
+from magic_cards.signals import import_finished, import_started
+from magic_cards.utils.cache import bump_cache_version
+from magic_cards.utils.sources import FALLBACK_MTG_JSON_URL, MTG_JSON_URL, get_source  # noqa: F401
+from magic_cards.utils.stats import ImportStats
+from magic_cards.utils.streaming import iter_object_items
 
-MTG_JSON_URL = 'https://mtgjson.com/json/AllSets-x.json.zip'
-FALLBACK_MTG_JSON_URL = 'http://mtgjson.com/json/AllSets-x.json.zip'
+
+BATCH_SIZE = 500
+CARD_FIELDS = ['mana_cost', 'text', 'power', 'toughness', 'loyalty', 'type_line', 'type_flags']
+PRINTING_FIELDS = ['card_id', 'rarity', 'flavor_text', 'artist_id', 'number', 'multiverse_id']
+# The keys of the printing data from `normalize_set` that correspond to `PRINTING_FIELDS`
+PRINTING_DATA_FIELDS = ['card', 'rarity', 'flavor_text', 'artist', 'number', 'multiverse_id']
+TYPE_FIELDS = [('supertypes', CardSupertype), ('types', CardType), ('subtypes', CardSubtype)]
+DIFF_MODELS = [Set, Card, Printing, Artist, CardSupertype, CardType, CardSubtype]
 
 
 class Everything:
@@ -19,21 +37,72 @@ class Everything:
     pass
 
 
-def fetch_data():
-    try:
-        r = requests.get(MTG_JSON_URL)
-    except requests.ConnectionError:
-        r = requests.get(FALLBACK_MTG_JSON_URL)
-    with closing(r), zipfile.ZipFile(io.BytesIO(r.content)) as archive:
-        unzipped_files = archive.infolist()
-        if len(unzipped_files) != 1:
-            raise RuntimeError("Found an unexpected number of files in the MTGJSON archive.")
-        data = archive.read(archive.infolist()[0])
-    decoded_data = data.decode('utf-8')
-    sets_data = json.loads(decoded_data)
+def _open_member(archive):
+    """
+    Opens the single JSON file contained in the MTGJSON archive as a text stream.
+    """
+    unzipped_files = archive.infolist()
+    if len(unzipped_files) != 1:
+        raise RuntimeError("Found an unexpected number of files in the MTGJSON archive.")
+    return io.TextIOWrapper(archive.open(unzipped_files[0]), encoding='utf-8')
+
+
+def fetch_data(source=None):
+    """
+    Returns the MTGJSON data from `source` (by default, the MTGJSON website; see `get_source`)
+    as a dictionary keyed by set code.
+    """
+    with get_source(source).open() as fileobj, zipfile.ZipFile(fileobj) as archive:
+        with _open_member(archive) as member:
+            sets_data = json.load(member)
     return sets_data
 
 
+def stream_archive(fileobj, stats=None):
+    """
+    Yields `(set_code, set_data)` pairs one at a time from the zipped MTGJSON file `fileobj`,
+    without decoding the whole document at once.
+
+    Time spent opening the archive and decoding each set is recorded in `stats`, an
+    `ImportStats`, under 'unzip' and 'decode'.
+    """
+    stats = stats or ImportStats()
+    with stats.phase('unzip'):
+        archive = zipfile.ZipFile(fileobj)
+    with archive, _open_member(archive) as member:
+        items = iter_object_items(member)
+        while True:
+            # Phases must not span a yield, so only the decoding itself is timed.
+            with stats.phase('decode'):
+                item = next(items, None)
+            if item is None:
+                return
+            yield item
+
+
+def stream_data(source=None, stats=None):
+    """
+    Yields `(set_code, set_data)` pairs one at a time from `source` (by default, the MTGJSON
+    website; see `get_source`).
+
+    Time spent fetching the archive is recorded in `stats` under 'download'.
+    """
+    stats = stats or ImportStats()
+    opened = get_source(source).open()
+    # Sources fetch the archive when their context is entered, so only that part is timed and the
+    # context is exited by hand.
+    with stats.phase('download'):
+        fileobj = opened.__enter__()
+    try:
+        for item in stream_archive(fileobj, stats=stats):
+            yield item
+    except BaseException:
+        if not opened.__exit__(*sys.exc_info()):
+            raise
+    else:
+        opened.__exit__(None, None, None)
+
+
 def parse_rarity(string):
     if string == 'Mythic Rare':
         return Printing.Rarity.MYTHIC
@@ -49,6 +118,25 @@ def parse_rarity(string):
         return Printing.Rarity.SPECIAL
 
 
+def chunked(items, size):
+    """
+    Splits the list `items` into lists of at most `size` elements.
+    """
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def bulk_update(model, objs, fields):
+    """
+    Saves `fields` on each of `objs` in as few queries as the installed Django version allows.
+    """
+    if hasattr(model.objects, 'bulk_update'):
+        model.objects.bulk_update(objs, fields, batch_size=BATCH_SIZE)
+    else:
+        # QuerySet.bulk_update is only available from Django 2.2 onwards.
+        for obj in objs:
+            model.objects.filter(pk=obj.pk).update(**{field: getattr(obj, field) for field in fields})
+
+
 class ModelCache(dict):
     def get_or_create(self, model, field, value, **kwargs):
         """
@@ -67,120 +155,534 @@ class ModelCache(dict):
             created = True
         return result, created
 
+    def bulk_get_or_create(self, model, field, values):
+        """
+        Retrieves objects of class `model` for each lookup key in `values` from the cache. Any that
+        are not found are created based on `field=value` with a single `bulk_create`.
+
+        Returns a dictionary mapping each of `values` to its object.
+        """
+        objects = self[model]
+        missing = sorted(set(values) - set(objects))
+        if missing:
+            model.objects.bulk_create([model(**{field: value}) for value in missing], batch_size=BATCH_SIZE)
+            # Not every database backend sets primary keys in bulk_create, so read them back.
+            for batch in chunked(missing, BATCH_SIZE):
+                for obj in model.objects.filter(**{field + '__in': batch}):
+                    objects[getattr(obj, field)] = obj
+        return {value: objects[value] for value in values}
+
+
+def sync_card_links(field_name, links):
+    """
+    Makes the rows of the through table behind the `Card` M2M field `field_name` match `links`,
+    a dictionary mapping Card ids to sets of related object ids, for the Cards in `links`.
+
+    Returns the number of rows deleted and created.
+    """
+    field = Card._meta.get_field(field_name)
+    through = getattr(Card, field_name).through
+    card_column = field.m2m_field_name() + '_id'
+    related_column = field.m2m_reverse_field_name() + '_id'
 
-def parse_data(sets_data, set_codes):
-    # Load supertypes, types, and subtypes into memory
+    existing = set()
+    stale_ids = []
+    for batch in chunked(list(links), BATCH_SIZE):
+        rows = through.objects.filter(**{card_column + '__in': batch}).values_list('id', card_column, related_column)
+        for pk, card_id, related_id in rows:
+            if related_id in links[card_id]:
+                existing.add((card_id, related_id))
+            else:
+                stale_ids.append(pk)
+    for batch in chunked(stale_ids, BATCH_SIZE):
+        through.objects.filter(id__in=batch).delete()
+
+    rows_to_create = [
+        through(**{card_column: card_id, related_column: related_id})
+        for card_id, related_ids in links.items()
+        for related_id in related_ids
+        if (card_id, related_id) not in existing
+    ]
+    through.objects.bulk_create(rows_to_create, batch_size=BATCH_SIZE)
+    return len(stale_ids) + len(rows_to_create)
+
+
+def hash_data(data):
+    """
+    Returns a stable SHA-1 hex digest of the JSON-serializable `data`.
+    """
+    serialized = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(serialized.encode('utf-8')).hexdigest()
+
+
+def parse_card_fields(card_data):
+    """
+    Extracts the values of `CARD_FIELDS` from MTGJSON card data.
+    """
+    supertypes, types, subtypes = (card_data.get(field_name, []) for field_name, _ in TYPE_FIELDS)
+    return {
+        'mana_cost': card_data.get('manaCost', ''),
+        'text': card_data.get('text', ''),
+        'power': card_data.get('power', ''),
+        'toughness': card_data.get('toughness', ''),
+        'loyalty': card_data.get('loyalty', None),
+        'type_line': make_type_line(supertypes, types, subtypes),
+        'type_flags': make_type_flags(supertypes + types),
+    }
+
+
+def normalize_set(item):
+    """
+    Extracts what the importer stores from the MTGJSON data of a single set, given as a
+    `(set_code, set_data)` pair, and computes the hashes of the set and of each card.
+
+    The result is a dictionary of plain values, and building it does not touch the database, so
+    this can run in a worker process.
+    """
+    code, data = item
+    cards = OrderedDict()
+    printings = []
+    for card_data in data['cards']:
+        # Skip tokens
+        if card_data['layout'] == 'token':
+            continue
+
+        # Card info. The hash only covers what is stored on the Card, so it is the same for every
+        # printing of the card.
+        card = parse_card_fields(card_data)
+        for field_name, _ in TYPE_FIELDS:
+            card[field_name] = card_data.get(field_name, [])
+        card['data_hash'] = hash_data(card)
+        cards[card_data['name']] = card
+
+        # Printing info
+        printings.append({
+            'card': card_data['name'],
+            'artist': card_data['artist'],
+            'rarity': parse_rarity(card_data['rarity']),
+            'flavor_text': card_data.get('flavor', ''),
+            'number': card_data.get('number', ''),  # Absent on old sets
+            'multiverse_id': card_data.get('multiverseid', None),  # Missing on certain sets
+        })
+
+    return {
+        'code': code,
+        'name': data['name'],
+        'data_hash': hash_data(data),
+        'cards': cards,
+        'printings': printings,
+    }
+
+
+def normalize_sets(sets_data, workers=1):
+    """
+    Yields the result of `normalize_set` for each `(set_code, set_data)` pair in `sets_data`, in
+    order.
+
+    With more than one worker, sets are normalized by a pool of `workers` processes. Sets are
+    handed to the pool a few at a time, so that a streamed `sets_data` is not read far ahead of the
+    sets being written.
+    """
+    if workers <= 1:
+        for item in sets_data:
+            yield normalize_set(item)
+        return
+
+    sets_data = iter(sets_data)
+    # Re-running django.setup() is harmless in forked workers, and configures spawned ones.
+    pool = multiprocessing.Pool(workers, initializer=django.setup)
+    try:
+        pending = pool.map_async(normalize_set, list(islice(sets_data, workers * 2)))
+        while True:
+            results = pending.get()
+            if not results:
+                break
+            # Normalize the next few sets while the caller writes these ones.
+            pending = pool.map_async(normalize_set, list(islice(sets_data, workers * 2)))
+            for result in results:
+                yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def upsert_cards(cards_data, cache, force=False, stats=None):
+    """
+    Creates or updates a Card for each entry of `cards_data`, a dictionary of card data (as
+    normalized by `normalize_set`) keyed by card name, and links it to its supertypes, types, and
+    subtypes.
+
+    Cards whose data hash has not changed since they were last imported are left alone, unless
+    `force` is set. Cards are read, created, and updated in bulk, so the number of queries does not
+    depend on the number of cards (up to `BATCH_SIZE`). Returns a dictionary mapping card names to
+    Card ids.
+
+    The work is recorded in `stats` under 'cards' and 'links'.
+    """
+    stats = stats or ImportStats()
+    with stats.phase('cards') as record:
+        card_ids, changed_names = _write_cards(cards_data, force)
+        record['rows'] += len(changed_names)
+
+    with stats.phase('links') as record:
+        for field_name, model in TYPE_FIELDS:
+            type_names = {name: cards_data[name][field_name] for name in changed_names}
+            known_types = len(cache[model])
+            types = cache.bulk_get_or_create(
+                model, 'name', {type_name for values in type_names.values() for type_name in values})
+            record['rows'] += len(cache[model]) - known_types
+            record['rows'] += sync_card_links(field_name, {
+                card_ids[name]: {types[type_name].pk for type_name in values}
+                for name, values in type_names.items()
+            })
+    return card_ids
+
+
+def _write_cards(cards_data, force):
+    """
+    Creates and updates the Cards of `upsert_cards`. Returns a dictionary mapping card names to
+    Card ids, and the list of names of the Cards that were written.
+    """
+    names = list(cards_data)
+    cards = {}
+    for batch in chunked(names, BATCH_SIZE):
+        for card in Card.objects.filter(name__in=batch):
+            cards[card.name] = card
+
+    cards_to_create = []
+    cards_to_update = []
+    changed_names = []
+    for name in names:
+        fields = {field: cards_data[name][field] for field in CARD_FIELDS + ['data_hash']}
+        card = cards.get(name)
+        if card is None:
+            cards_to_create.append(Card(name=name, **fields))
+        elif force or card.data_hash != fields['data_hash']:
+            for field, value in fields.items():
+                setattr(card, field, value)
+            cards_to_update.append(card)
+        else:
+            continue
+        changed_names.append(name)
+
+    if cards_to_create:
+        Card.objects.bulk_create(cards_to_create, batch_size=BATCH_SIZE)
+        # Not every database backend sets primary keys in bulk_create, so read them back.
+        for batch in chunked([card.name for card in cards_to_create], BATCH_SIZE):
+            for card in Card.objects.filter(name__in=batch).only('id', 'name'):
+                cards[card.name] = card
+    if cards_to_update:
+        bulk_update(Card, cards_to_update, CARD_FIELDS + ['data_hash'])
+
+    return {name: card.pk for name, card in cards.items()}, changed_names
+
+
+def printing_key(printing):
+    return tuple(getattr(printing, field) for field in PRINTING_FIELDS)
+
+
+def create_printings(magic_set, printings, check_existing=True):
+    """
+    Saves those of `printings`, a list of unsaved Printings of `magic_set`, that do not already
+    exist, using a constant number of queries.
+
+    Printing fields aren't unique for sets without proper multiverse_ids, so existing Printings are
+    counted rather than merely looked up: identical Printings are only created as many times as
+    they are missing.
+    """
+    existing = Counter()
+    if check_existing:
+        existing.update(Printing.objects.filter(set=magic_set).values_list(*PRINTING_FIELDS))
+
+    printings_to_create = []
+    for printing in printings:
+        key = printing_key(printing)
+        if existing[key]:
+            existing[key] -= 1
+        else:
+            printings_to_create.append(printing)
+    Printing.objects.bulk_create(printings_to_create, batch_size=BATCH_SIZE)
+    return printings_to_create
+
+
+def import_set(set_data, cache, force=False, stats=None):
+    """
+    Writes a set, as normalized by `normalize_set`, to the database along with its cards and
+    printings.
+
+    Returns False if the set was skipped because its data has not changed since it was last
+    imported (and `force` is not set), and True otherwise. The work is recorded in `stats` under
+    'sets', 'cards', 'links', and 'printings'.
+    """
+    stats = stats or ImportStats()
+
+    # Create the set, or skip it entirely if its data is unchanged
+    with stats.phase('sets') as record:
+        magic_set, set_created = cache.get_or_create(Set, 'code', set_data['code'], name=set_data['name'])
+        record['rows'] += set_created
+    if not (set_created or force) and magic_set.data_hash == set_data['data_hash']:
+        return False
+
+    # Create or update cards
+    card_ids = upsert_cards(set_data['cards'], cache, force=force, stats=stats)
+
+    with stats.phase('printings') as record:
+        _write_printings(set_data, magic_set, set_created, card_ids, cache, record)
+
+    # Record the data the set was imported from
+    with stats.phase('sets') as record:
+        magic_set.data_hash = set_data['data_hash']
+        record['rows'] += Set.objects.filter(pk=magic_set.pk).update(data_hash=magic_set.data_hash)
+    return True
+
+
+def _write_printings(set_data, magic_set, set_created, card_ids, cache, record):
+    """
+    Creates the Artists and Printings of `import_set`, adding the number of rows written to the
+    stats `record`.
+    """
+    # Create any new artists
+    known_artists = len(cache[Artist])
+    artists = cache.bulk_get_or_create(
+        Artist, 'full_name', {printing_data['artist'] for printing_data in set_data['printings']})
+    record['rows'] += len(cache[Artist]) - known_artists
+
+    printings = [
+        Printing(
+            card_id=card_ids[printing_data['card']],
+            set=magic_set,
+            rarity=printing_data['rarity'],
+            flavor_text=printing_data['flavor_text'],
+            artist=artists[printing_data['artist']],
+            number=printing_data['number'],
+            multiverse_id=printing_data['multiverse_id'],
+        )
+        for printing_data in set_data['printings']
+    ]
+    # If the Set was just created, we don't need to check if the Printings already exist.
+    record['rows'] += len(create_printings(magic_set, printings, check_existing=not set_created))
+
+
+def preload_cache(set_codes):
+    """
+    Returns a `ModelCache` of every supertype, type, subtype, and artist, and of the Sets with
+    codes in `set_codes`.
+    """
+    # Load supertypes, types, subtypes, and artists into memory
     cache = ModelCache()
     for model in [CardSupertype, CardType, CardSubtype]:
         cache[model] = {obj.name: obj for obj in model.objects.all()}
+    cache[Artist] = {obj.full_name: obj for obj in Artist.objects.all()}
     # Load relevant sets into memory
     if set_codes is Everything:
         cache[Set] = {obj.code: obj for obj in Set.objects.all()}
     else:
         cache[Set] = {obj.code: obj for obj in Set.objects.filter(code__in=set_codes)}
+    return cache
+
+
+def select_sets(sets_data, set_codes):
+    """
+    Returns the `(set_code, set_data)` pairs of `sets_data` (see `parse_data`) for the sets with
+    codes in `set_codes`.
+    """
+    if hasattr(sets_data, 'items'):
+        sets_data = sets_data.items()
+    # Skip sets that have not been chosen
+    if set_codes is not Everything:
+        sets_data = ((code, data) for code, data in sets_data if code in set_codes)
+    return sets_data
 
-    # Process the data set-by-set
-    for code, data in sets_data.items():
 
-        # Skip sets that have not been chosen
-        if set_codes is not Everything and code not in set_codes:
+def parse_data(sets_data, set_codes, force=False, workers=1, stats=None):
+    """
+    Imports `sets_data`, which is either a dictionary of MTGJSON data keyed by set code or an
+    iterable of `(set_code, set_data)` pairs such as the one returned by `stream_data`.
+
+    Sets and Cards whose data has not changed since they were last imported are skipped, unless
+    `force` is set. With more than one of `workers`, the data is normalized by a pool of processes
+    while this process writes it; see `normalize_sets`.
+
+    Returns `stats`, an `ImportStats` in which each phase of the import is recorded.
+    """
+    stats = stats or ImportStats()
+    with stats.phase('preload'):
+        cache = preload_cache(set_codes)
+
+    # Process the data set-by-set. Outside of a transaction, each set is committed on its own.
+    normalized_sets = normalize_sets(select_sets(sets_data, set_codes), workers=workers)
+    while True:
+        with stats.phase('parse'):
+            set_data = next(normalized_sets, None)
+        if set_data is None:
+            break
+        with transaction.atomic(savepoint=False):
+            import_set(set_data, cache, force=force, stats=stats)
+
+    with transaction.atomic(savepoint=False), stats.phase('cleanup') as record:
+        # Remove extra Printings caused by data that is duplicated on MTGJSON.
+        # https://github.com/mtgjson/mtgjson/issues/388
+        if set_codes is Everything or 'BOK' in set_codes:
+            bugged_card_names = ['Jaraku the Interloper', 'Scarmaker']
+            for name in bugged_card_names:
+                extra_printings = Printing.objects.filter(
+                    set__code='BOK', card__name=name)[1:].values_list(
+                        'pk', flat=True)
+                record['rows'] += _delete(Printing.objects.filter(pk__in=list(extra_printings)))
+
+        # Clean up any supertypes, subtypes, and types that have no Cards left.
+        for model in [CardSubtype, CardType, CardSupertype]:
+            record['rows'] += _delete(model.objects.filter(card__isnull=True))
+    return stats
+
+
+def _delete(queryset):
+    """
+    Deletes `queryset`, returning the number of rows deleted (which Django 1.8 does not report).
+    """
+    deleted = queryset.delete()
+    return deleted[0] if deleted else 0
+
+
+def diff_data(sets_data, set_codes, force=False, workers=1):
+    """
+    Works out what `parse_data` would change in the database, without writing anything.
+
+    Returns an ordered dictionary mapping each of `DIFF_MODELS` to a dictionary of the number of
+    its objects that would be 'created', 'updated', and 'deleted'. Like an import, this starts from
+    the preloaded cache and reads a few rows in bulk for each changed set, but everything else is
+    worked out in memory. (The removal of duplicate BOK printings is not accounted for.)
+    """
+    cache = preload_cache(set_codes)
+    diff = OrderedDict((model, {'created': 0, 'updated': 0, 'deleted': 0}) for model in DIFF_MODELS)
+    state = {
+        # The data hash and the type names of each Card that has been read or would be written
+        'card_hashes': {},
+        'card_types': {},
+        # The number of Cards that each supertype, type, and subtype would be linked to
+        'type_counts': {
+            model: dict(model.objects.annotate(num_cards=Count('card')).values_list('name', 'num_cards'))
+            for _, model in TYPE_FIELDS
+        },
+        'created_cards': set(),
+        'updated_cards': set(),
+    }
+
+    for set_data in normalize_sets(select_sets(sets_data, set_codes), workers=workers):
+        magic_set = cache[Set].get(set_data['code'])
+        if magic_set is None:
+            diff[Set]['created'] += 1
+        elif force or magic_set.data_hash != set_data['data_hash']:
+            diff[Set]['updated'] += 1
+        else:
             continue
+        _diff_cards(set_data['cards'], force, state, diff)
+
+        new_artists = {printing_data['artist'] for printing_data in set_data['printings']} - set(cache[Artist])
+        diff[Artist]['created'] += len(new_artists)
+        cache[Artist].update(dict.fromkeys(new_artists))
 
-        # Create the set
-        magic_set, set_created = cache.get_or_create(Set, 'code', code, name=data['name'])
-
-        printings_to_create = []
-
-        # Create cards
-        all_cards_data = data['cards']
-        for card_data in all_cards_data:
-            # Skip tokens
-            layout = card_data['layout']
-            if layout == 'token':
-                continue
-
-            # Card info
-            name = card_data['name']
-            mana_cost = card_data.get('manaCost', '')
-            text = card_data.get('text', '')
-            power = card_data.get('power', '')
-            toughness = card_data.get('toughness', '')
-            loyalty = card_data.get('loyalty', None)
-            card, created = Card.objects.update_or_create(
-                name=name, defaults={
-                    'mana_cost': mana_cost,
-                    'text': text,
-                    'power': power,
-                    'toughness': toughness,
-                    'loyalty': loyalty,
-                })
-            supertypes = card_data.get('supertypes', [])
-            types = card_data['types']
-            subtypes = card_data.get('subtypes', [])
-            if not created:
-                card.supertypes.clear()
-                card.types.clear()
-                card.subtypes.clear()
-            for supertype_name in supertypes:
-                supertype, _ = cache.get_or_create(CardSupertype, 'name', supertype_name)
-                card.supertypes.add(supertype)
-            for type_name in types:
-                card_type, _ = cache.get_or_create(CardType, 'name', type_name)
-                card.types.add(card_type)
-            for subtype_name in subtypes:
-                subtype, _ = cache.get_or_create(CardSubtype, 'name', subtype_name)
-                card.subtypes.add(subtype)
-
-            # Printing info
-            artist_name = card_data['artist']
-            artist, _ = Artist.objects.get_or_create(full_name=artist_name)
-            multiverse_id = card_data.get('multiverseid', None)  # Missing on certain sets
-            flavor_text = card_data.get('flavor', '')
-            rarity = card_data['rarity']
-            number = card_data.get('number', '')  # Absent on old sets
-            # If the Set was just created, we don't need to check if the Printing already exists,
-            # and we can leverage bulk_create.
-            printing_kwargs = {
-                'card': card,
-                'set': magic_set,
-                'rarity': parse_rarity(rarity),
-                'flavor_text': flavor_text,
-                'artist': artist,
-                'number': number,
-                'multiverse_id': multiverse_id
-            }
-            if set_created:
-                printings_to_create.append(Printing(**printing_kwargs))
+        existing = Counter()
+        if magic_set is not None:
+            existing.update(Printing.objects.filter(set=magic_set).values_list(
+                'card__name', 'rarity', 'flavor_text', 'artist__full_name', 'number', 'multiverse_id'))
+        for printing_data in set_data['printings']:
+            key = tuple(printing_data[field] for field in PRINTING_DATA_FIELDS)
+            if existing[key]:
+                existing[key] -= 1
             else:
-                # Use .filter().exists() followed by a create() instead of get_or_create,
-                # since these kwargs aren't unique for sets without proper multiverse_ids.
-                if not Printing.objects.filter(**printing_kwargs).exists():
-                    Printing.objects.create(**printing_kwargs)
-
-        if printings_to_create:
-            Printing.objects.bulk_create(printings_to_create)
-
-    # Remove extra Printings caused by data that is duplicated on MTGJSON.
-    # https://github.com/mtgjson/mtgjson/issues/388
-    if set_codes is Everything or 'BOK' in set_codes:
-        bugged_card_names = ['Jaraku the Interloper', 'Scarmaker']
-        for name in bugged_card_names:
-            extra_printings = Printing.objects.filter(
-                set__code='BOK', card__name=name)[1:].values_list(
-                    'pk', flat=True)
-            Printing.objects.filter(pk__in=list(extra_printings)).delete()
-
-    # Clean up any supertypes, subtypes, and types that have no Cards left.
-    for model in [CardSubtype, CardType, CardSupertype]:
-        for obj in model.objects.all():
-            if obj.card_set.count() == 0:
-                obj.delete()
-
-
-@transaction.atomic
-def import_cards(set_codes=Everything):
-    sets_data = fetch_data()
-    parse_data(sets_data, set_codes)
+                diff[Printing]['created'] += 1
+
+    diff[Card]['created'] = len(state['created_cards'])
+    diff[Card]['updated'] = len(state['updated_cards'] - state['created_cards'])
+    # Types that would have no Cards left are cleaned up.
+    for model, counts in state['type_counts'].items():
+        diff[model]['deleted'] = sum(1 for count in counts.values() if not count)
+    return diff
+
+
+def _diff_cards(cards_data, force, state, diff):
+    """
+    Works out which Cards of `cards_data` (see `upsert_cards`) would be created or updated, and
+    how their links to supertypes, types, and subtypes would change, for `diff_data`.
+    """
+    card_hashes, card_types, type_counts = state['card_hashes'], state['card_types'], state['type_counts']
+    unread = [name for name in cards_data if name not in card_hashes]
+    for batch in chunked(unread, BATCH_SIZE):
+        card_hashes.update(Card.objects.filter(name__in=batch).values_list('name', 'data_hash'))
+    changed = [name for name in cards_data if force or card_hashes.get(name) != cards_data[name]['data_hash']]
+
+    # Read the current links of the existing Cards that would change
+    unread = [name for name in changed if name in card_hashes and name not in card_types]
+    for name in unread:
+        card_types[name] = {field_name: set() for field_name, _ in TYPE_FIELDS}
+    for field_name, _ in TYPE_FIELDS:
+        field = Card._meta.get_field(field_name)
+        through = getattr(Card, field_name).through
+        card_name = field.m2m_field_name() + '__name'
+        type_name = field.m2m_reverse_field_name() + '__name'
+        for batch in chunked(unread, BATCH_SIZE):
+            for name, value in through.objects.filter(**{card_name + '__in': batch}).values_list(card_name, type_name):
+                card_types[name][field_name].add(value)
+
+    for name in changed:
+        card_data = cards_data[name]
+        if name in card_hashes:
+            state['updated_cards'].add(name)
+        else:
+            state['created_cards'].add(name)
+        old_types = card_types.get(name, {})
+        new_types = {field_name: set(card_data[field_name]) for field_name, _ in TYPE_FIELDS}
+        for field_name, model in TYPE_FIELDS:
+            counts = type_counts[model]
+            for value in old_types.get(field_name, set()) - new_types[field_name]:
+                counts[value] -= 1
+            for value in new_types[field_name] - old_types.get(field_name, set()):
+                if value not in counts:
+                    diff[model]['created'] += 1
+                    counts[value] = 0
+                counts[value] += 1
+        card_hashes[name] = card_data['data_hash']
+        card_types[name] = new_types
+
+
+def diff_cards(set_codes=Everything, force=False, workers=1, source=None):
+    """
+    Returns what `import_cards` would change in the database (see `diff_data`), without writing
+    anything.
+    """
+    return diff_data(stream_data(source), set_codes, force=force, workers=workers)
+
+
+def import_cards(set_codes=Everything, force=False, workers=1, per_set_transactions=False, source=None,
+                 stats=None):
+    """
+    Imports the sets with codes in `set_codes` (by default, every set) from `source` (by default,
+    the MTGJSON website; see `get_source`).
+
+    The import runs in a single transaction, unless `per_set_transactions` is set, in which case
+    each set is committed as soon as it has been imported. An interrupted import then keeps the
+    sets it completed, and running it again resumes where it stopped: the completed sets are
+    recorded with the hash of their data, so they are skipped (unless `force` is set).
+
+    Returns a dictionary of the time taken, queries run, and rows written by each phase of the
+    import (see `ImportStats.as_dict`). Queries are only counted if `stats` is an `ImportStats`
+    created with `count_queries` set. The `import_started` and `import_finished` signals are sent
+    before and after the import, and cached card bundles are invalidated once it completes (see
+    `magic_cards.utils.cache`).
+    """
+    stats = stats or ImportStats()
+    import_started.send(sender=None, set_codes=set_codes)
+    if per_set_transactions:
+        parse_data(stream_data(source, stats=stats), set_codes, force=force, workers=workers, stats=stats)
+    else:
+        with transaction.atomic():
+            parse_data(stream_data(source, stats=stats), set_codes, force=force, workers=workers, stats=stats)
+    clear_id_index_cache()
+    bump_cache_version()
+    result = stats.as_dict()
+    import_finished.send(sender=None, set_codes=set_codes, stats=result)
+    return result
 
 
 if __name__ == "__main__":
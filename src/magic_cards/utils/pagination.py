@@ -0,0 +1,40 @@
+from django.core.paginator import Paginator
+from django.db import connections, models
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A paginator that estimates the number of objects rather than counting them, when paging through
+    the whole of a large table, where an exact COUNT(*) would read every row.
+
+    On PostgreSQL, the estimate is the planner's row count from the last ANALYZE; elsewhere, it is
+    the largest primary key, which only overestimates by the number of deleted rows. Filtered
+    querysets, and tables estimated at fewer than `estimate_threshold` rows, are counted exactly.
+    """
+    estimate_threshold = 10000
+
+    @cached_property
+    def count(self):
+        estimate = self.estimate_count()
+        if estimate is not None and estimate >= self.estimate_threshold:
+            return estimate
+        return super(EstimatedCountPaginator, self).count
+
+    def estimate_count(self):
+        """
+        Returns an estimate of the number of objects, or None if they cannot be estimated.
+        """
+        queryset = self.object_list
+        if not isinstance(queryset, models.QuerySet) or queryset.query.where:
+            return None
+        model = queryset.model
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [model._meta.db_table])
+                row = cursor.fetchone()
+            return int(row[0]) if row else None
+        if isinstance(model._meta.pk, models.AutoField):
+            return model._default_manager.using(queryset.db).aggregate(max_pk=models.Max('pk'))['max_pk'] or 0
+        return None
@@ -1,16 +1,75 @@
+from __future__ import absolute_import, division
+
 import random
 
+from django.utils.six.moves import range
+
+
+class WeightedSampler(object):
+    """
+    Draws elements from a weighted sample in constant time, using Walker's alias method.
+
+    `choices` is a dictionary with labels (buckets) as keys and weights (probabilities) as values.
+    Building the sampler takes linear time; each draw afterwards takes constant time. Buckets with
+    a weight of zero are never drawn.
+
+    `rng` may be a `random.Random` instance to draw from; by default the `random` module is used.
+    """
+
+    def __init__(self, choices, rng=None):
+        self.rng = rng or random
+        self.buckets = [bucket for bucket, weight in choices.items() if weight > 0]
+        if not self.buckets:
+            raise ValueError("At least one choice must have a positive weight.")
+
+        n = len(self.buckets)
+        total = sum(choices[bucket] for bucket in self.buckets)
+        scaled = [choices[bucket] * n / total for bucket in self.buckets]
+        self.probabilities = [1.0] * n
+        self.aliases = list(range(n))
+
+        # Pair each underfull column with an overfull one, which donates the remainder of its mass.
+        small = [i for i, weight in enumerate(scaled) if weight < 1]
+        large = [i for i, weight in enumerate(scaled) if weight >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probabilities[less] = scaled[less]
+            self.aliases[less] = more
+            scaled[more] += scaled[less] - 1
+            if scaled[more] < 1:
+                small.append(more)
+            else:
+                large.append(more)
+        # Anything left over is full up to floating point error, and keeps probability 1.
+
+    def choice(self):
+        """
+        Returns a single element from the weighted sample.
+        """
+        column = int(self.rng.random() * len(self.buckets))
+        if self.rng.random() < self.probabilities[column]:
+            return self.buckets[column]
+        return self.buckets[self.aliases[column]]
+
+    def choices(self, k):
+        """
+        Returns a list of `k` elements drawn independently (i.e. with replacement) from the weighted sample.
+        """
+        rand = self.rng.random
+        buckets, probabilities, aliases = self.buckets, self.probabilities, self.aliases
+        n = len(buckets)
+        result = []
+        for _ in range(k):
+            column = int(rand() * n)
+            result.append(buckets[column] if rand() < probabilities[column] else buckets[aliases[column]])
+        return result
+
 
 def weighted_choice(choices):
     """
     Return a single element from a weighted sample.
 
     `choices` is a dictionary with labels (buckets) as keys and weights (probabilities) as values.
+    To draw repeatedly from the same weights, build a `WeightedSampler` once instead.
     """
-    total = sum(choices.values())
-    r = random.uniform(0, total)
-    items = sorted(choices.items(), key=lambda x: x[1])
-    for bucket, weight in items:
-        r -= weight
-        if r <= 0:
-            return bucket
+    return WeightedSampler(choices).choice()
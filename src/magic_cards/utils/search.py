@@ -0,0 +1,69 @@
+"""
+Full-text search over the name and rules text of Cards.
+
+On PostgreSQL, Cards are matched against a GIN index of their text search vector. On SQLite, they are
+matched against an external-content FTS5 table over the Card table, which triggers on the Card table
+keep up to date however Cards are written. Elsewhere (or without FTS5), searches fall back to
+case-insensitive substring matching.
+
+The index, table, and triggers are created by migrations 0006 and 0008. SQLite drops the triggers
+along with the Card table whenever a migration rebuilds it, so any later migration that alters the
+Card table must create them again.
+"""
+from __future__ import unicode_literals
+
+import re
+
+from django.db import connections
+from django.db.models import Q
+
+SEARCH_CONFIG = 'english'
+SEARCH_TABLE = 'magic_cards_card_fts'
+
+# The text search vector of a Card. Queries must use this same expression for PostgreSQL to use the index.
+SEARCH_VECTOR = "to_tsvector('{config}', {table}\"name\" || ' ' || {table}\"text\")"
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Whether each database connection has FTS5, by alias.
+_fts5_available = {}
+
+
+def search_backend(connection):
+    """
+    Returns the search backend of `connection`: 'postgresql', 'fts5', or None for substring matching.
+    """
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor == 'sqlite':
+        if connection.alias not in _fts5_available:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+                _fts5_available[connection.alias] = bool(cursor.fetchone()[0])
+        if _fts5_available[connection.alias]:
+            return 'fts5'
+    return None
+
+
+def search_cards(queryset, query):
+    """
+    Filters `queryset` of Cards down to those whose name or rules text contains every word of
+    `query`. Each word also matches as a prefix, so that partial input finds results.
+    """
+    words = _TOKEN_RE.findall(query)
+    if not words:
+        return queryset.none()
+
+    backend = search_backend(connections[queryset.db])
+    if backend == 'postgresql':
+        return queryset.extra(
+            where=["{} @@ to_tsquery('{}', %s)".format(
+                SEARCH_VECTOR.format(config=SEARCH_CONFIG, table='"magic_cards_card".'), SEARCH_CONFIG)],
+            params=[' & '.join(word + ':*' for word in words)])
+    if backend == 'fts5':
+        return queryset.extra(
+            where=['"magic_cards_card"."id" IN (SELECT rowid FROM {0} WHERE {0} MATCH %s)'.format(SEARCH_TABLE)],
+            params=[' '.join('"{}"*'.format(word) for word in words)])
+    for word in words:
+        queryset = queryset.filter(Q(name__icontains=word) | Q(text__icontains=word))
+    return queryset
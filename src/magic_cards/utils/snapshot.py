@@ -0,0 +1,164 @@
+"""
+A compact, read-only snapshot of the card catalogue, for processes that read it often but never
+write to it.
+
+A snapshot holds, for each Card, its name, mana cost, type line and flags, and the codes of the
+Sets it was printed in, and for each Set the sorted ids of its Cards. Repeated strings (set codes,
+type lines, mana costs) are stored once, rows are tuples, and ids are packed into arrays, so a
+snapshot of the whole catalogue takes a small fraction of the memory of the equivalent model
+instances. Once built or loaded, it never queries the database.
+"""
+import bisect
+import io
+import pickle
+from array import array
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.utils import six
+
+from magic_cards.models import TYPE_FLAGS, Card, Printing, Set, make_type_flags
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+CardRecord = namedtuple('CardRecord', ['id', 'name', 'mana_cost', 'type_line', 'type_flags', 'set_codes'])
+SetRecord = namedtuple('SetRecord', ['code', 'name', 'card_ids'])
+
+
+class Snapshot(object):
+    """
+    A read-only snapshot of Cards and Sets. Build one from the database with `from_database`, and
+    save and restore it with `dump` and `load`.
+    """
+    __slots__ = ('cards', 'sets', '_by_id')
+
+    def __init__(self, cards, sets):
+        # CardRecords keyed by name, and SetRecords keyed by code
+        self.cards = cards
+        self.sets = sets
+        self._by_id = None
+
+    @classmethod
+    def from_database(cls):
+        """
+        Builds a snapshot of every Card and Set with three queries.
+        """
+        strings = {}
+        set_rows = list(Set.objects.values_list('id', 'code', 'name'))
+        set_codes = {set_id: _intern(strings, code) for set_id, code, _ in set_rows}
+        card_sets = {}
+        set_card_ids = {set_id: set() for set_id in set_codes}
+        for card_id, set_id in Printing.objects.values_list('card_id', 'set_id').distinct().iterator():
+            card_sets.setdefault(card_id, set()).add(set_id)
+            set_card_ids[set_id].add(card_id)
+
+        cards = {}
+        fields = ['id', 'name', 'mana_cost', 'type_line', 'type_flags']
+        for card_id, name, mana_cost, type_line, type_flags in Card.objects.values_list(*fields).iterator():
+            codes = tuple(sorted(set_codes[set_id] for set_id in card_sets.get(card_id, ())))
+            cards[name] = CardRecord(
+                card_id, name, _intern(strings, mana_cost), _intern(strings, type_line), type_flags, codes)
+
+        sets = {}
+        for set_id, code, name in set_rows:
+            sets[set_codes[set_id]] = SetRecord(set_codes[set_id], name, array('i', sorted(set_card_ids[set_id])))
+        return cls(cards, sets)
+
+    def dump(self, path_or_file):
+        """
+        Writes the snapshot to `path_or_file`, a path or a binary file object.
+        """
+        data = {
+            'version': SNAPSHOT_FORMAT_VERSION,
+            'cards': [tuple(card) for card in self.cards.values()],
+            'sets': [tuple(record) for record in self.sets.values()],
+        }
+        with _open(path_or_file, 'wb') as f:
+            # Protocol 2 can be read by every supported version of Python.
+            pickle.dump(data, f, protocol=2)
+
+    @classmethod
+    def load(cls, path_or_file):
+        """
+        Reads a snapshot written by `dump` from `path_or_file`, a path or a binary file object.
+        """
+        with _open(path_or_file, 'rb') as f:
+            data = pickle.load(f)
+        if data['version'] != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError("Unsupported snapshot format version {}.".format(data['version']))
+
+        # Unpickling makes a new copy of every string, so share equal ones again.
+        strings = {}
+        cards = {}
+        for card_id, name, mana_cost, type_line, type_flags, set_codes in data['cards']:
+            cards[name] = CardRecord(
+                card_id, name, _intern(strings, mana_cost), _intern(strings, type_line), type_flags,
+                tuple(_intern(strings, code) for code in set_codes))
+        sets = {}
+        for code, name, card_ids in data['sets']:
+            code = _intern(strings, code)
+            sets[code] = SetRecord(code, name, card_ids)
+        return cls(cards, sets)
+
+    def __len__(self):
+        return len(self.cards)
+
+    def __iter__(self):
+        return iter(self.cards.values())
+
+    def __contains__(self, name):
+        return name in self.cards
+
+    def get(self, name):
+        """
+        Returns the CardRecord of the Card named `name`, or None if there is none.
+        """
+        return self.cards.get(name)
+
+    def get_by_id(self, card_id):
+        if self._by_id is None:
+            self._by_id = {card.id: card for card in self.cards.values()}
+        return self._by_id.get(card_id)
+
+    def of_type(self, *names):
+        """
+        Returns the CardRecords, in no particular order, of the Cards that have every one of the
+        supertypes, types, and subtypes in `names` (see `CardQuerySet.of_type`).
+        """
+        mask = make_type_flags(names)
+        words = {name for name in names if name not in TYPE_FLAGS}
+        return [
+            card for card in self.cards.values()
+            if card.type_flags & mask == mask and words.issubset(card.type_line.split(' '))
+        ]
+
+    def in_set(self, name, set_code):
+        """
+        Returns whether the Card named `name` was printed in the Set with code `set_code`.
+        """
+        card, magic_set = self.cards.get(name), self.sets.get(set_code)
+        if card is None or magic_set is None:
+            return False
+        i = bisect.bisect_left(magic_set.card_ids, card.id)
+        return i < len(magic_set.card_ids) and magic_set.card_ids[i] == card.id
+
+    def set_cards(self, set_code):
+        """
+        Returns the CardRecords of the Cards printed in the Set with code `set_code`.
+        """
+        return [self.get_by_id(card_id) for card_id in self.sets[set_code].card_ids]
+
+
+def _intern(strings, value):
+    # sys.intern does not accept unicode strings on Python 2, so share strings through a dictionary.
+    return strings.setdefault(value, value)
+
+
+@contextmanager
+def _open(path_or_file, mode):
+    # File objects belong to the caller, so only files opened here are closed.
+    if isinstance(path_or_file, six.string_types):
+        with io.open(path_or_file, mode) as f:
+            yield f
+    else:
+        yield path_or_file
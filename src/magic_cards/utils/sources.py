@@ -0,0 +1,142 @@
+"""
+Sources of the zipped MTGJSON AllSets file.
+
+A source is any object with an `open()` method that returns a context manager producing a binary,
+seekable file object of the archive.
+"""
+import io
+import json
+import os
+import tempfile
+from contextlib import closing, contextmanager
+
+import requests
+from django.utils import six
+
+MTG_JSON_URL = 'https://mtgjson.com/json/AllSets-x.json.zip'
+FALLBACK_MTG_JSON_URL = 'http://mtgjson.com/json/AllSets-x.json.zip'
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class HTTPSource(object):
+    """
+    Downloads the archive from MTGJSON, retrying over plain HTTP if the connection fails.
+
+    The download is streamed in chunks to a temporary file, so the archive is never held in memory
+    as a whole.
+    """
+
+    def __init__(self, url=MTG_JSON_URL, fallback_url=FALLBACK_MTG_JSON_URL):
+        self.url = url
+        self.fallback_url = fallback_url
+
+    def get(self, headers=None):
+        try:
+            r = requests.get(self.url, headers=headers, stream=True)
+        except requests.ConnectionError:
+            if not self.fallback_url:
+                raise
+            r = requests.get(self.fallback_url, headers=headers, stream=True)
+        return r
+
+    @staticmethod
+    def download(r, f):
+        """
+        Writes the body of the streamed response `r` to the binary file object `f`, chunk by chunk.
+        """
+        r.raise_for_status()
+        for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            f.write(chunk)
+
+    @contextmanager
+    def open(self):
+        r = self.get()
+        with closing(r), tempfile.TemporaryFile() as f:
+            self.download(r, f)
+            f.seek(0)
+            yield f
+
+
+class CachedHTTPSource(HTTPSource):
+    """
+    Downloads the archive from MTGJSON into `cache_dir`, and re-uses the cached copy for as long
+    as MTGJSON reports that it is unchanged (based on its ETag and Last-Modified headers).
+    """
+
+    def __init__(self, cache_dir, *args, **kwargs):
+        super(CachedHTTPSource, self).__init__(*args, **kwargs)
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, os.path.basename(self.url))
+        self.metadata_path = self.path + '.json'
+
+    def read_metadata(self):
+        if not (os.path.exists(self.path) and os.path.exists(self.metadata_path)):
+            return {}
+        with io.open(self.metadata_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def refresh(self):
+        """
+        Downloads the archive into the cache unless the cached copy is up to date.
+
+        Returns True if a new copy was downloaded.
+        """
+        metadata = self.read_metadata()
+        headers = {}
+        if metadata.get('etag'):
+            headers['If-None-Match'] = metadata['etag']
+        if metadata.get('last_modified'):
+            headers['If-Modified-Since'] = metadata['last_modified']
+
+        r = self.get(headers=headers)
+        with closing(r):
+            if r.status_code == 304:
+                return False
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            # Write to a temporary file first, so that an interrupted download never replaces a
+            # good copy.
+            temporary_path = self.path + '.part'
+            with io.open(temporary_path, 'wb') as f:
+                self.download(r, f)
+            os.rename(temporary_path, self.path)
+            metadata = {'etag': r.headers.get('ETag'), 'last_modified': r.headers.get('Last-Modified')}
+        with io.open(self.metadata_path, 'w', encoding='utf-8') as f:
+            f.write(six.text_type(json.dumps(metadata)))
+        return True
+
+    @contextmanager
+    def open(self):
+        self.refresh()
+        with io.open(self.path, 'rb') as f:
+            yield f
+
+
+class LocalSource(object):
+    """
+    Reads the archive from `path_or_file`, which is either the path of a local copy or a binary
+    file object. File objects are not closed.
+    """
+
+    def __init__(self, path_or_file):
+        self.path_or_file = path_or_file
+
+    @contextmanager
+    def open(self):
+        if isinstance(self.path_or_file, six.string_types):
+            with io.open(self.path_or_file, 'rb') as f:
+                yield f
+        else:
+            yield self.path_or_file
+
+
+def get_source(source=None):
+    """
+    Returns `source` as a source object: None stands for the MTGJSON website, and a path or file
+    object for a local copy of the archive.
+    """
+    if source is None:
+        return HTTPSource()
+    if isinstance(source, six.string_types) or not hasattr(source, 'open'):
+        return LocalSource(source)
+    return source
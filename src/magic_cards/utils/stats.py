@@ -0,0 +1,87 @@
+from __future__ import division
+
+import timeit
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# The phases of an import, in the order they happen.
+PHASES = [
+    'download',  # Fetching the MTGJSON archive from its source
+    'unzip',  # Opening the archive
+    'decode',  # Decompressing and decoding the JSON data
+    'preload',  # Loading existing objects into the importer's cache
+    'parse',  # Normalizing each set's data (or waiting for worker processes to do so)
+    'sets',  # Creating Sets and recording their data hashes
+    'cards',  # Creating and updating Cards
+    'links',  # Linking Cards to their supertypes, types, and subtypes
+    'printings',  # Creating Artists and Printings
+    'cleanup',  # Removing duplicate Printings and orphaned types
+]
+
+
+class ImportStats(object):
+    """
+    Records the wall time, number of SQL queries, and number of rows written in each phase of an
+    import.
+
+    Phases may be nested, in which case time and queries are attributed to the innermost phase
+    only. Counting queries requires Django's debug cursor, which is enabled while a phase runs if
+    `count_queries` is set; the connection's `queries_log` is consumed in the process.
+    """
+
+    def __init__(self, count_queries=False, using=DEFAULT_DB_ALIAS):
+        self.count_queries = count_queries
+        self.connection = connections[using]
+        self.phases = OrderedDict((name, self.empty_record()) for name in PHASES)
+        self._stack = []
+        self._started = None
+        self._force_debug_cursor = None
+
+    @staticmethod
+    def empty_record():
+        return {'time': 0.0, 'queries': 0, 'rows': 0}
+
+    def _pause(self):
+        if self._stack:
+            record = self.phases[self._stack[-1]]
+            record['time'] += timeit.default_timer() - self._started
+            if self.count_queries:
+                record['queries'] += len(self.connection.queries_log)
+
+    def _resume(self):
+        if self.count_queries:
+            self.connection.queries_log.clear()
+        self._started = timeit.default_timer()
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Attributes everything that happens within the block to the phase `name`. Yields the phase's
+        record, so that the block can add to its `rows`.
+        """
+        if self.count_queries and not self._stack:
+            self._force_debug_cursor = self.connection.force_debug_cursor
+            self.connection.force_debug_cursor = True
+        self._pause()
+        self._stack.append(name)
+        record = self.phases.setdefault(name, self.empty_record())
+        self._resume()
+        try:
+            yield record
+        finally:
+            self._pause()
+            self._stack.pop()
+            self._resume()
+            if self.count_queries and not self._stack:
+                self.connection.force_debug_cursor = self._force_debug_cursor
+
+    def as_dict(self):
+        """
+        Returns the records of every phase, followed by their sum under 'total'.
+        """
+        result = OrderedDict((name, dict(record)) for name, record in self.phases.items())
+        result['total'] = {
+            key: sum(record[key] for record in self.phases.values()) for key in self.empty_record()}
+        return result
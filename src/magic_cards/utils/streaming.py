@@ -0,0 +1,97 @@
+import json
+
+WHITESPACE = ' \t\n\r'
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+
+
+class _Reader(object):
+    """
+    A growable window over a text stream, consumed from the front as values are decoded.
+    """
+
+    def __init__(self, stream, chunk_size):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """
+        Reads more text from the stream. Returns False if the stream is exhausted.
+        """
+        if self.eof:
+            return False
+        # Drop the consumed prefix, then read at least as much as is already buffered so that
+        # re-decoding a large value after each read stays linear overall.
+        self.buffer = self.buffer[self.pos:]
+        self.pos = 0
+        chunk = self.stream.read(max(self.chunk_size, len(self.buffer)))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer += chunk
+        return True
+
+    def next_char(self):
+        """
+        Skips whitespace and returns the next character without consuming it ('' at the end).
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        found = self.next_char()
+        if found != char:
+            raise ValueError("Expected {!r} but found {!r} in JSON stream.".format(char, found))
+        self.pos += 1
+
+    def decode(self):
+        """
+        Decodes and consumes the next complete JSON value.
+        """
+        self.next_char()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                if not self.fill():
+                    raise
+                continue
+            # A value that runs to the very end of the buffer (e.g. a number) may be truncated.
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_object_items(stream, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Incrementally decodes a JSON object from the text file-like `stream`, yielding its
+    `(key, value)` pairs one at a time.
+
+    Only the top-level object is streamed; each value is decoded in full, so peak memory is
+    bounded by the largest value rather than by the whole document.
+    """
+    reader = _Reader(stream, chunk_size)
+    reader.expect('{')
+    if reader.next_char() == '}':
+        return
+    while True:
+        key = reader.decode()
+        reader.expect(':')
+        value = reader.decode()
+        yield key, value
+        separator = reader.next_char()
+        reader.pos += 1
+        if separator == '}':
+            return
+        elif separator != ',':
+            raise ValueError("Expected ',' or '}}' but found {!r} in JSON stream.".format(separator))
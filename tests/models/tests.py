@@ -1,10 +1,24 @@
 from __future__ import unicode_literals
 
+import time
+
 import six
-from django.test import TestCase
+from django.db import connection
+from django.contrib import admin
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from magic_cards.admin import PrintingAdmin, SetCodeListFilter
+from magic_cards.models import (
+    ID_INDEX_TIMEOUT, Artist, Card, CardSubtype, CardType, Printing, PrintingQuerySet, Set, _id_index_cache,
+    clear_id_index_cache, make_type_flags, make_type_line)
+from magic_cards.utils.cache import bump_cache_version
+from magic_cards.utils.import_cards import Everything, import_cards, parse_data
 
-from magic_cards.models import Artist, Card, Printing, Set
-from magic_cards.utils.import_cards import import_cards
+try:
+    from unittest import mock
+except ImportError:
+    import mock
 
 
 class UnicodeTests(TestCase):
@@ -66,3 +80,317 @@ class ImportScriptTests(TestCase):
 
         tracker = Card.objects.get(name="Ulvenwald Tracker")
         self.assertIsNone(tracker.loyalty)
+
+
+class CardQuerySetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for name, supertypes, types, subtypes in [
+            ("Llanowar Elves", [], ['Creature'], ['Elf', 'Druid']),
+            ("Ezuri, Renegade Leader", ['Legendary'], ['Creature'], ['Elf', 'Warrior']),
+            ("Elvish Champion", [], ['Creature'], ['Elf']),
+            ("Elfhame Palace", [], ['Land'], []),
+            ("Shelldock Isle", [], ['Land'], []),
+            ("Wrath of God", [], ['Sorcery'], []),
+            ("Bramblewood Paragon", [], ['Creature'], ['Elf', 'Warrior']),
+            ("Steel Overseer", [], ['Artifact', 'Creature'], ['Construct']),
+        ]:
+            Card.objects.create(
+                name=name, type_line=make_type_line(supertypes, types, subtypes),
+                type_flags=make_type_flags(supertypes + types))
+
+    def names(self, queryset):
+        return sorted(queryset.values_list('name', flat=True))
+
+    def test_type_line(self):
+        self.assertEqual(Card.objects.get(name="Ezuri, Renegade Leader").type_line,
+                         "Legendary Creature \u2014 Elf Warrior")
+        self.assertEqual(Card.objects.get(name="Wrath of God").type_line, "Sorcery")
+
+    def test_of_type(self):
+        self.assertEqual(self.names(Card.objects.of_type('Land')), ["Elfhame Palace", "Shelldock Isle"])
+        self.assertEqual(self.names(Card.objects.of_type('Artifact', 'Creature')), ["Steel Overseer"])
+        self.assertEqual(self.names(Card.objects.of_type('Legendary', 'Creature')), ["Ezuri, Renegade Leader"])
+
+    def test_of_subtype(self):
+        # Subtypes are whole words: neither "Elfhame" nor "Elvish" is an Elf.
+        self.assertEqual(
+            self.names(Card.objects.of_type('Elf')),
+            ["Bramblewood Paragon", "Elvish Champion", "Ezuri, Renegade Leader", "Llanowar Elves"])
+        self.assertEqual(
+            self.names(Card.objects.of_type('Creature', 'Elf', 'Warrior')),
+            ["Bramblewood Paragon", "Ezuri, Renegade Leader"])
+        self.assertEqual(self.names(Card.objects.of_type('Goblin')), [])
+
+    def test_of_type_is_case_sensitive(self):
+        # On every database, and in Snapshot.of_type, names only match with the case they are printed in.
+        self.assertEqual(self.names(Card.objects.of_type('creature')), [])
+        self.assertEqual(self.names(Card.objects.of_type('elf')), [])
+        self.assertEqual(self.names(Card.objects.of_type('Creature', 'warrior')), [])
+        # Names are matched literally, not as patterns.
+        self.assertEqual(self.names(Card.objects.of_type('El.')), [])
+        self.assertEqual(self.names(Card.objects.of_type('Elf|Construct')), [])
+
+    def test_of_type_does_not_join(self):
+        with CaptureQueriesContext(connection) as context:
+            list(Card.objects.of_type('Legendary', 'Creature', 'Elf'))
+        self.assertNotIn('JOIN', context.captured_queries[0]['sql'])
+
+
+class CardSearchTests(TestCase):
+
+    @staticmethod
+    def make_sets_data(cards):
+        return {'AAA': {'name': 'Set AAA', 'code': 'AAA', 'cards': [
+            {'layout': 'normal', 'name': name, 'text': text, 'types': ['Creature'], 'artist': 'Artist',
+             'rarity': 'Common', 'number': str(i), 'multiverseid': i}
+            for i, (name, text) in enumerate(cards)
+        ]}}
+
+    def setUp(self):
+        parse_data(self.make_sets_data([
+            ("Serra Angel", "Flying, vigilance"),
+            ("Shivan Dragon", "Flying\n{R}: Shivan Dragon gets +1/+0 until end of turn."),
+            ("Grizzly Bears", ""),
+        ]), Everything)
+
+    def names(self, query):
+        return sorted(Card.objects.search(query).values_list('name', flat=True))
+
+    def test_search(self):
+        self.assertEqual(self.names("flying"), ["Serra Angel", "Shivan Dragon"])
+        self.assertEqual(self.names("Flying vigilance"), ["Serra Angel"])
+        self.assertEqual(self.names("bears"), ["Grizzly Bears"])
+        self.assertEqual(self.names("fly"), ["Serra Angel", "Shivan Dragon"])
+        self.assertEqual(self.names("trample"), [])
+        self.assertEqual(self.names('"OR" *'), [])
+
+    def test_search_fallback(self):
+        with mock.patch('magic_cards.utils.search.search_backend', return_value=None):
+            self.assertEqual(self.names("flying"), ["Serra Angel", "Shivan Dragon"])
+            self.assertEqual(self.names("fly vigil"), ["Serra Angel"])
+
+    def test_import_refreshes_index(self):
+        parse_data(self.make_sets_data([
+            ("Serra Angel", "Flying, vigilance"),
+            ("Shivan Dragon", "Trample"),
+            ("Grizzly Bears", ""),
+        ]), Everything)
+        self.assertEqual(self.names("flying"), ["Serra Angel"])
+        self.assertEqual(self.names("trample"), ["Shivan Dragon"])
+
+    def test_orm_writes_update_index(self):
+        card = Card.objects.create(name="Llanowar Elves", text="{T}: Add {G}.")
+        self.assertEqual(self.names("llanowar"), ["Llanowar Elves"])
+
+        card.name = "Elvish Mystic"
+        card.save()
+        self.assertEqual(self.names("llanowar"), [])
+        self.assertEqual(self.names("mystic"), ["Elvish Mystic"])
+
+        Card.objects.filter(name="Serra Angel").update(text="Lifelink")
+        self.assertEqual(self.names("vigilance"), [])
+        self.assertEqual(self.names("lifelink"), ["Serra Angel"])
+
+        card.delete()
+        Card.objects.filter(name="Grizzly Bears").delete()
+        self.assertEqual(self.names("mystic"), [])
+        self.assertEqual(self.names("bears"), [])
+        self.assertEqual(self.names("flying"), ["Shivan Dragon"])
+
+
+class RelatedQuerySetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        creature = CardType.objects.create(name='Creature')
+        elf = CardSubtype.objects.create(name='Elf')
+        artist = Artist.objects.create(full_name='Artist')
+        sets = [Set.objects.create(name='Set {}'.format(i), code='S{}'.format(i)) for i in range(2)]
+        for i in range(20):
+            card = Card.objects.create(name='Card {}'.format(i))
+            card.types.add(creature)
+            card.subtypes.add(elf)
+            for magic_set in sets:
+                Printing.objects.create(card=card, set=magic_set, artist=artist, number=str(i))
+
+    def assertConstantQueries(self, num, render):
+        for size in [2, 20]:
+            with self.assertNumQueries(num):
+                render(size)
+
+    def test_printings_with_related(self):
+        self.assertConstantQueries(1, lambda size: [
+            (str(printing), printing.artist.full_name) for printing in Printing.objects.with_related()[:size]])
+
+    def test_printings_for_display(self):
+        self.assertConstantQueries(4, lambda size: [
+            (str(printing), [obj.name for obj in printing.card.subtypes.all()])
+            for printing in Printing.objects.for_display()[:size]])
+
+    def test_cards_with_related(self):
+        self.assertConstantQueries(4, lambda size: [
+            [obj.name for obj in card.types.all()] for card in Card.objects.with_related()[:size]])
+
+    def test_cards_for_display(self):
+        def render(size):
+            for card in Card.objects.for_display()[:size]:
+                [obj.name for obj in card.subtypes.all()]
+                self.assertEqual([str(printing) for printing in card.printings.all()],
+                                 ['{} (S0)'.format(card), '{} (S1)'.format(card)])
+        self.assertConstantQueries(5, render)
+
+    def test_printing_admin(self):
+        model_admin = PrintingAdmin(Printing, admin.site)
+        request = RequestFactory().get('/')
+        self.assertConstantQueries(1, lambda size: [
+            str(printing) for printing in model_admin.get_queryset(request)[:size]])
+
+
+class PrintingAdminTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        artist = Artist.objects.create(full_name='Artist')
+        sets = [Set.objects.create(name='Set {}'.format(i), code='S{}'.format(i)) for i in range(2)]
+        for name in ['Shivan Dragon', 'Shivan Hellkite', 'Crimson Shivan']:
+            card = Card.objects.create(name=name)
+            for magic_set in sets:
+                Printing.objects.create(card=card, set=magic_set, artist=artist)
+
+    def setUp(self):
+        self.model_admin = PrintingAdmin(Printing, admin.site)
+        self.request = RequestFactory().get('/')
+
+    def test_prefix_search(self):
+        queryset, _ = self.model_admin.get_search_results(
+            self.request, self.model_admin.get_queryset(self.request), 'shivan')
+        self.assertEqual(
+            sorted(set(queryset.values_list('card__name', flat=True))), ['Shivan Dragon', 'Shivan Hellkite'])
+
+    def test_set_filter(self):
+        list_filter = SetCodeListFilter(self.request, {'set': 'S1'}, Printing, self.model_admin)
+        with self.assertNumQueries(1):
+            self.assertEqual(list(list_filter.lookups(self.request, self.model_admin)),
+                             [('S0', 'Set 0'), ('S1', 'Set 1')])
+        queryset = list_filter.queryset(self.request, Printing.objects.all())
+        self.assertEqual(queryset.count(), 3)
+        self.assertEqual(set(queryset.values_list('set__code', flat=True)), {'S1'})
+
+
+class PrintingQuerySetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        artist = Artist.objects.create(full_name="Rebecca Guay")
+        sets = [Set.objects.create(name="Set {}".format(i), code="S{}".format(i)) for i in range(2)]
+        Card.objects.bulk_create([Card(name="Card {}".format(i)) for i in range(60)])
+        Printing.objects.bulk_create([
+            Printing(card=card, set=sets[i % 2], artist=artist, rarity=Printing.Rarity.COMMON)
+            for i, card in enumerate(Card.objects.all())
+        ])
+
+    def setUp(self):
+        clear_id_index_cache()
+
+    def test_random(self):
+        printings = Printing.objects.random(10)
+        self.assertEqual(len(printings), 10)
+        self.assertEqual(len(set(printing.pk for printing in printings)), 10)
+
+    def test_random_filtered(self):
+        queryset = Printing.objects.filter(set__code="S1")
+        ids = queryset.random_ids(30)
+        self.assertEqual(sorted(ids), sorted(queryset.values_list('id', flat=True)))
+
+    def test_random_with_gaps(self):
+        Printing.objects.filter(id__in=list(Printing.objects.values_list('id', flat=True))[5:55]).delete()
+        self.assertEqual(len(Printing.objects.random_ids(8)), 8)
+
+    def test_random_too_many(self):
+        with self.assertRaises(ValueError):
+            Printing.objects.random(61)
+
+    def test_random_does_not_load_all_ids(self):
+        for num in [3, 40]:
+            with CaptureQueriesContext(connection) as context:
+                self.assertEqual(len(set(Printing.objects.random_ids(num))), num)
+            queries = [query['sql'] for query in context]
+            self.assertNotIn('SELECT "magic_cards_printing"."id" FROM "magic_cards_printing"', queries)
+            self.assertFalse([sql for sql in queries if 'COUNT(' in sql])
+
+    def test_random_probes_in_batches(self):
+        with mock.patch.object(PrintingQuerySet, 'SAMPLE_BATCH_SIZE', 10), \
+                CaptureQueriesContext(connection) as context:
+            ids = Printing.objects.random_ids(50)
+        self.assertEqual(len(set(ids)), 50)
+        # Bounds, then several batches of probes, each of at most 10 ids.
+        self.assertGreater(len(context), 5)
+        self.assertNotIn('SELECT "magic_cards_printing"."id" FROM "magic_cards_printing"', [
+            query['sql'] for query in context])
+
+    def test_random_sparse_filtered(self):
+        # The three Printings of S2 lie at the far ends of a range of 63 ids.
+        magic_set = Set.objects.create(name="Set 2", code="S2")
+        card = Card.objects.create(name="Card 60")
+        first = Printing.objects.order_by('id').first()
+        first.set = magic_set
+        first.save()
+        for _ in range(2):
+            Printing.objects.create(card=card, set=magic_set, artist=first.artist, rarity=Printing.Rarity.COMMON)
+        queryset = Printing.objects.filter(set__code="S2")
+        self.assertEqual(sorted(queryset.random_ids(3)), sorted(queryset.values_list('id', flat=True)))
+        with self.assertRaises(ValueError):
+            queryset.random_ids(4)
+
+    def test_id_index_is_cached(self):
+        queryset = Printing.objects.filter(set__code="S0")
+        ids = queryset.id_index()
+        self.assertEqual(list(ids), sorted(queryset.values_list('id', flat=True)))
+
+        with self.assertNumQueries(0):
+            self.assertIs(Printing.objects.filter(set__code="S0").id_index(), ids)
+            self.assertEqual(len(Printing.objects.filter(set__code="S0").random_ids(5, cached=True)), 5)
+        with self.assertNumQueries(1):
+            Printing.objects.filter(set__code="S1").id_index()
+
+    def test_id_index_is_invalidated_by_cache_version(self):
+        ids = Printing.objects.id_index()
+        # As another process does once its import completes.
+        bump_cache_version()
+        with self.assertNumQueries(1):
+            self.assertIsNot(Printing.objects.id_index(), ids)
+
+    def test_id_index_expires(self):
+        ids = Printing.objects.id_index()
+        with mock.patch('magic_cards.models.time.time', return_value=time.time() + ID_INDEX_TIMEOUT + 1):
+            self.assertIsNot(Printing.objects.id_index(), ids)
+        self.assertIsNot(Printing.objects.id_index(refresh=True), ids)
+
+    def test_id_index_cache_is_bounded(self):
+        with mock.patch('magic_cards.models.ID_INDEX_CACHE_SIZE', 2):
+            s0 = Printing.objects.filter(set__code="S0").id_index()
+            Printing.objects.filter(set__code="S1").id_index()
+            Printing.objects.filter(set__code="S0").id_index()
+            Printing.objects.id_index()
+            self.assertEqual(len(_id_index_cache), 2)
+            # The least recently used index, that of S1, was discarded.
+            with self.assertNumQueries(0):
+                self.assertIs(Printing.objects.filter(set__code="S0").id_index(), s0)
+            with self.assertNumQueries(1):
+                Printing.objects.filter(set__code="S1").id_index()
+
+    def test_id_index_empty_queryset(self):
+        self.assertEqual(len(Printing.objects.none().id_index()), 0)
+
+    def test_random_cached(self):
+        printings = Printing.objects.filter(set__code="S1").random(5, cached=True)
+        self.assertEqual(len(printings), 5)
+        self.assertFalse([printing for printing in printings if printing.set.code != "S1"])
+
+    def test_import_clears_id_index(self):
+        ids = Printing.objects.id_index()
+        with mock.patch('magic_cards.utils.import_cards.stream_data', return_value=[]):
+            import_cards()
+        self.assertIsNot(Printing.objects.id_index(), ids)
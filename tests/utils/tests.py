@@ -1,15 +1,71 @@
 import copy
+import io
 import json
 import os
+import random
+import shutil
+import tempfile
 import unittest
+import zipfile
+from collections import OrderedDict
 
 from django.core.management import call_command
 from django.db.models import Count
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils.six import StringIO
 
-from magic_cards.models import Card, CardSubtype, Printing, Set
-from magic_cards.utils.import_cards import Everything, fetch_data, import_cards, parse_data
+from magic_cards.models import Artist, Card, CardSubtype, CardSupertype, CardType, Printing, Set
+from magic_cards.models import TYPE_FLAGS, clear_id_index_cache
+from magic_cards.signals import import_finished, import_started
+from magic_cards.utils.boosters import generate_boosters
+from magic_cards.utils.catalogue import CatalogueReader, dump_catalogue
+from magic_cards.utils.cache import bump_cache_version, get_cache, get_card_bundle, get_card_bundles
+from magic_cards.utils.import_cards import (
+    DIFF_MODELS, Everything, ModelCache, diff_data, fetch_data, hash_data, import_cards, normalize_set, parse_data,
+    stream_archive, stream_data, upsert_cards)
+from magic_cards.utils.pagination import EstimatedCountPaginator
+from magic_cards.utils.random import WeightedSampler, weighted_choice
+from magic_cards.utils.snapshot import Snapshot
+from magic_cards.utils.sources import CachedHTTPSource, LocalSource
+from magic_cards.utils.stats import PHASES, ImportStats
+from magic_cards.utils.streaming import iter_object_items
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+FIXTURES_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'fixtures')
+
+
+def make_set_data(code, num_cards, text='Flying'):
+    """
+    Builds MTGJSON data for a set of `num_cards` cards, each with its own artist.
+    """
+    return {
+        'name': 'Set {}'.format(code),
+        'code': code,
+        'cards': [
+            {
+                'layout': 'normal',
+                'name': 'Card {}'.format(i),
+                'manaCost': '{{{}}}'.format(i),
+                'text': text,
+                'power': '1',
+                'toughness': '1',
+                'supertypes': ['Legendary'] if i % 2 else [],
+                'types': ['Creature'],
+                'subtypes': ['Elf', 'Warrior'] if i % 3 else ['Goblin'],
+                'artist': 'Artist {}'.format(i),
+                'rarity': 'Common',
+                'number': str(i),
+                'multiverseid': 1000 + i,
+            }
+            for i in range(num_cards)
+        ],
+    }
 
 
 SOM_CARDS = 234
@@ -157,7 +213,7 @@ class ImportScriptTests(ImportTestBase, TestCase):
 
 class ImportScriptUpdateTests(TestCase):
 
-    FIXTURES_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'fixtures')
+    FIXTURES_DIR = FIXTURES_DIR
 
     def test_update_text(self):
         with open(os.path.join(self.FIXTURES_DIR, 'eyes_in_the_skies.json')) as f:
@@ -194,12 +250,15 @@ class ImportScriptUpdateTests(TestCase):
         jackal_pup = Card.objects.first()
         self.assertEqual(jackal_pup.subtypes.count(), 1)
         self.assertEqual(jackal_pup.subtypes.first().name, original_subtype)
+        self.assertEqual(jackal_pup.type_line, u'Creature \u2014 Hound')
 
         # Import the final, updated data.
         parse_data(final_data, ['TMP'])
         jackal_pup.refresh_from_db()
         self.assertEqual(jackal_pup.subtypes.count(), 1)
         self.assertEqual(jackal_pup.subtypes.first().name, 'Jackal')
+        self.assertEqual(jackal_pup.type_line, u'Creature \u2014 Jackal')
+        self.assertEqual(jackal_pup.type_flags, TYPE_FLAGS['Creature'])
         # The Hound subtype has been deleted.
         self.assertFalse(CardSubtype.objects.filter(name=original_subtype).exists())
 
@@ -248,3 +307,712 @@ class ImportManagementCommandTests(ImportTestBase, TestCase):
         self.assertEqual(Card.objects.count(), SOM_CARDS)
         self.assertEqual(Printing.objects.count(), SOM_PRINTINGS)
         self.check_common_set_constraints()
+
+
+class StreamingTests(TestCase):
+
+    @staticmethod
+    def load_fixtures(*filenames):
+        sets_data = {}
+        for filename in filenames:
+            with io.open(os.path.join(FIXTURES_DIR, filename), encoding='utf-8') as f:
+                sets_data.update(json.load(f))
+        return sets_data
+
+    @staticmethod
+    def make_archive(sets_data):
+        fileobj = io.BytesIO()
+        with zipfile.ZipFile(fileobj, 'w') as archive:
+            archive.writestr('AllSets-x.json', json.dumps(sets_data, indent=2).encode('utf-8'))
+        fileobj.seek(0)
+        return fileobj
+
+    def test_iter_object_items(self):
+        document = '{"a": {"b": [1, 2.5, "}"]}, "c": 12345, "d": null, "e": "\\u00e9"}'
+        for chunk_size in [1, 3, 7, 1024]:
+            items = list(iter_object_items(io.StringIO(document), chunk_size=chunk_size))
+            self.assertEqual(items, [('a', {'b': [1, 2.5, '}']}), ('c', 12345), ('d', None), ('e', u'\u00e9')])
+
+    def test_iter_empty_object(self):
+        self.assertEqual(list(iter_object_items(io.StringIO(' { } '))), [])
+
+    def test_iter_truncated_object(self):
+        with self.assertRaises(ValueError):
+            list(iter_object_items(io.StringIO('{"a": {"b": 1}'), chunk_size=2))
+
+    def test_stream_archive(self):
+        sets_data = self.load_fixtures('jackal_pup.json', 'eyes_in_the_skies.json')
+        streamed = dict(stream_archive(self.make_archive(sets_data)))
+        self.assertEqual(streamed, sets_data)
+
+    def test_parse_streamed_data(self):
+        sets_data = self.load_fixtures('jackal_pup.json', 'eyes_in_the_skies.json')
+        parse_data(stream_archive(self.make_archive(sets_data)), ['TMP'])
+
+        self.assertEqual(Set.objects.get().code, 'TMP')
+        self.assertEqual(Card.objects.get().name, 'Jackal Pup')
+
+
+class BulkUpsertTests(TestCase):
+
+    @staticmethod
+    def make_cards_data(num_cards, text='Flying'):
+        return normalize_set(('TST', make_set_data('TST', num_cards, text)))['cards']
+
+    @staticmethod
+    def make_cache():
+        cache = ModelCache()
+        for model in [CardSupertype, CardType, CardSubtype]:
+            cache[model] = {obj.name: obj for obj in model.objects.all()}
+        return cache
+
+    def count_queries(self, cards_data):
+        cache = self.make_cache()
+        with CaptureQueriesContext(connection) as context:
+            upsert_cards(cards_data, cache)
+        return len(context)
+
+    def test_upsert_creates_cards_and_links(self):
+        card_ids = upsert_cards(self.make_cards_data(6), self.make_cache())
+
+        self.assertEqual(Card.objects.count(), 6)
+        self.assertEqual(card_ids, dict(Card.objects.values_list('name', 'id')))
+        card = Card.objects.get(name='Card 1')
+        self.assertEqual(card.mana_cost, '{1}')
+        self.assertEqual([t.name for t in card.supertypes.all()], ['Legendary'])
+        self.assertEqual([t.name for t in card.types.all()], ['Creature'])
+        self.assertEqual(sorted(t.name for t in card.subtypes.all()), ['Elf', 'Warrior'])
+
+    def test_upsert_updates_cards_and_links(self):
+        upsert_cards(self.make_cards_data(6), self.make_cache())
+        updated_data = self.make_cards_data(6, text='Trample')
+        updated_data['Card 1']['subtypes'] = ['Goblin']
+        updated_data['Card 3']['supertypes'] = []
+        upsert_cards(updated_data, self.make_cache())
+
+        self.assertEqual(Card.objects.count(), 6)
+        self.assertFalse(Card.objects.exclude(text='Trample').exists())
+        card = Card.objects.get(name='Card 1')
+        self.assertEqual([t.name for t in card.subtypes.all()], ['Goblin'])
+        self.assertFalse(Card.objects.get(name='Card 3').supertypes.exists())
+        self.assertTrue(Card.objects.get(name='Card 5').supertypes.exists())
+
+    def test_upsert_query_count_is_constant(self):
+        small = self.count_queries(self.make_cards_data(5))
+        for model in [Card, CardSupertype, CardType, CardSubtype]:
+            model.objects.all().delete()
+        large = self.count_queries(self.make_cards_data(50))
+        self.assertEqual(small, large)
+
+        # Re-importing unchanged cards only reads them.
+        self.assertEqual(self.count_queries(self.make_cards_data(50)), 1)
+
+
+class ImportQueryCountTests(TestCase):
+
+    def count_queries(self, sets_data):
+        with CaptureQueriesContext(connection) as context:
+            parse_data(sets_data, Everything)
+        return len(context)
+
+    def test_new_set_query_count_is_constant(self):
+        small = self.count_queries({'AAA': make_set_data('AAA', 5)})
+        for model in [Printing, Set, Card, Artist, CardSupertype, CardType, CardSubtype]:
+            model.objects.all().delete()
+        self.assertEqual(self.count_queries({'AAA': make_set_data('AAA', 50)}), small)
+
+    def test_cleanup_query_count_is_constant(self):
+        parse_data({'AAA': make_set_data('AAA', 5)}, Everything)
+
+        def count_cleanup_queries(num_orphans):
+            for model in [CardSupertype, CardType, CardSubtype]:
+                model.objects.bulk_create([model(name='Orphan {}'.format(i)) for i in range(num_orphans)])
+            queries = self.count_queries({})
+            for model in [CardSupertype, CardType, CardSubtype]:
+                self.assertFalse(model.objects.filter(name__startswith='Orphan').exists())
+            return queries
+
+        self.assertEqual(count_cleanup_queries(1), count_cleanup_queries(50))
+        # Types that are still in use are kept.
+        self.assertEqual(CardSubtype.objects.count(), 3)
+
+    def test_artists_are_reused(self):
+        parse_data({'AAA': make_set_data('AAA', 5)}, Everything)
+        parse_data({'BBB': make_set_data('BBB', 10)}, Everything)
+
+        self.assertEqual(Artist.objects.count(), 10)
+        self.assertEqual(Printing.objects.filter(artist__full_name='Artist 0').count(), 2)
+
+
+class ChangeDetectionTests(TestCase):
+
+    def count_writes(self, sets_data, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            parse_data(sets_data, Everything, **kwargs)
+        return len([query for query in context if not query['sql'].startswith('SELECT')])
+
+    def test_unchanged_set_is_skipped(self):
+        parse_data({'AAA': make_set_data('AAA', 10)}, Everything)
+        self.assertEqual(Set.objects.get().data_hash, hash_data(make_set_data('AAA', 10)))
+
+        self.assertEqual(self.count_writes({'AAA': make_set_data('AAA', 10)}), 0)
+        self.assertEqual(Printing.objects.count(), 10)
+
+    def test_only_changed_cards_are_updated(self):
+        parse_data({'AAA': make_set_data('AAA', 10)}, Everything)
+        sets_data = {'AAA': make_set_data('AAA', 10)}
+        sets_data['AAA']['cards'][3]['text'] = 'Trample'
+
+        with CaptureQueriesContext(connection) as context:
+            parse_data(sets_data, Everything)
+        updates = [query for query in context if query['sql'].startswith('UPDATE "magic_cards_card"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Card.objects.get(name='Card 3').text, 'Trample')
+
+    def test_cards_shared_between_sets_are_not_rewritten(self):
+        parse_data({'AAA': make_set_data('AAA', 10)}, Everything)
+        with CaptureQueriesContext(connection) as context:
+            parse_data({'BBB': make_set_data('BBB', 10)}, Everything)
+        self.assertFalse([query for query in context if query['sql'].startswith('UPDATE "magic_cards_card"')])
+        self.assertEqual(Printing.objects.count(), 20)
+
+    def test_force(self):
+        parse_data({'AAA': make_set_data('AAA', 10)}, Everything)
+        self.assertNotEqual(self.count_writes({'AAA': make_set_data('AAA', 10)}, force=True), 0)
+        self.assertEqual(Card.objects.count(), 10)
+        self.assertEqual(Printing.objects.count(), 10)
+
+
+class PrintingReconciliationTests(TestCase):
+
+    def test_missing_printings_are_created(self):
+        parse_data({'AAA': make_set_data('AAA', 10)}, Everything)
+        Printing.objects.filter(card__name__in=['Card 2', 'Card 7']).delete()
+
+        parse_data({'AAA': make_set_data('AAA', 10)}, Everything, force=True)
+        self.assertEqual(Printing.objects.count(), 10)
+        self.assertEqual(Printing.objects.filter(card__name='Card 2').count(), 1)
+
+    def test_identical_printings_are_counted(self):
+        sets_data = {'AAA': make_set_data('AAA', 3)}
+        sets_data['AAA']['cards'].append(dict(sets_data['AAA']['cards'][0]))
+        parse_data(sets_data, Everything)
+        self.assertEqual(Printing.objects.count(), 4)
+
+        parse_data(sets_data, Everything, force=True)
+        self.assertEqual(Printing.objects.count(), 4)
+
+    def test_reimport_query_count_is_constant(self):
+        sets_data = {'AAA': make_set_data('AAA', 5), 'BBB': make_set_data('BBB', 50)}
+        parse_data(sets_data, Everything)
+        for data in sets_data.values():
+            data['releaseDate'] = '2017-10-26'
+
+        with CaptureQueriesContext(connection) as small:
+            parse_data({'AAA': sets_data['AAA']}, Everything)
+        with CaptureQueriesContext(connection) as large:
+            parse_data({'BBB': sets_data['BBB']}, Everything)
+        self.assertEqual(len(small), len(large))
+
+
+class WeightedSamplerTests(unittest.TestCase):
+
+    def test_distribution(self):
+        weights = {'mythic': 1, 'rare': 7, 'uncommon': 24, 'never': 0}
+        sampler = WeightedSampler(weights, rng=random.Random(0))
+        draws = sampler.choices(32000)
+
+        self.assertNotIn('never', draws)
+        for bucket in ['mythic', 'rare', 'uncommon']:
+            self.assertAlmostEqual(draws.count(bucket) / 32000.0, weights[bucket] / 32.0, delta=0.01)
+
+    def test_choice(self):
+        sampler = WeightedSampler({'only': 0.5}, rng=random.Random(0))
+        self.assertEqual(set(sampler.choice() for _ in range(10)), {'only'})
+
+    def test_no_positive_weights(self):
+        with self.assertRaises(ValueError):
+            WeightedSampler({'never': 0})
+
+    def test_weighted_choice(self):
+        self.assertIn(weighted_choice({'a': 1, 'b': 2}), ['a', 'b'])
+
+
+class BoosterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        sets_data = {'NEW': make_set_data('NEW', 28), 'OLD': make_set_data('OLD', 21)}
+        rarities = ['Mythic Rare'] * 2 + ['Rare'] * 4 + ['Uncommon'] * 6 + ['Common'] * 11 + ['Basic Land'] * 5
+        for card_data, rarity in zip(sets_data['NEW']['cards'], rarities):
+            card_data['rarity'] = rarity
+        for card_data, rarity in zip(sets_data['OLD']['cards'], rarities[2:]):
+            card_data['rarity'] = rarity
+        parse_data(sets_data, Everything)
+
+    def setUp(self):
+        clear_id_index_cache()
+
+    def test_generate_boosters(self):
+        packs = generate_boosters('NEW', 100, rng=random.Random(0))
+
+        self.assertEqual(len(packs), 100)
+        for pack in packs:
+            self.assertEqual(len(pack), 15)
+            self.assertEqual(len(set(printing.pk for printing in pack)), 15)
+            self.assertEqual([printing.set.code for printing in pack], ['NEW'] * 15)
+            self.assertIn(pack[0].rarity, [Printing.Rarity.MYTHIC, Printing.Rarity.RARE])
+            self.assertEqual([printing.rarity for printing in pack[1:4]], [Printing.Rarity.UNCOMMON] * 3)
+            self.assertEqual([printing.rarity for printing in pack[4:14]], [Printing.Rarity.COMMON] * 10)
+            self.assertEqual(pack[14].rarity, Printing.Rarity.BASIC_LAND)
+        self.assertIn(Printing.Rarity.MYTHIC, [pack[0].rarity for pack in packs])
+
+    def test_fallback_rarities(self):
+        packs = generate_boosters('OLD', 10, rng=random.Random(0))
+
+        for pack in packs:
+            self.assertEqual(pack[0].rarity, Printing.Rarity.RARE)
+            self.assertEqual(pack[14].rarity, Printing.Rarity.COMMON)
+            # Only 11 commons are available for 11 slots.
+            self.assertEqual(len(set(printing.pk for printing in pack)), 15)
+
+    def test_query_count_is_constant(self):
+        with CaptureQueriesContext(connection) as context:
+            generate_boosters('NEW', 1)
+        with self.assertNumQueries(len(context)):
+            clear_id_index_cache()
+            generate_boosters('NEW', 100)
+        # Once the candidate ids are cached, only the chosen printings are fetched.
+        with self.assertNumQueries(1):
+            generate_boosters('NEW', 100)
+
+    def test_many_chosen_printings(self):
+        # Enough packs to choose more than MAX_LOOKUP_IDS distinct Printings, which are fetched
+        # along with the rest of the set instead of by id.
+        with mock.patch('magic_cards.utils.boosters.MAX_LOOKUP_IDS', 10):
+            packs = generate_boosters('NEW', 20, rng=random.Random(0))
+        self.assertEqual(len(packs), 20)
+        for pack in packs:
+            self.assertEqual(len(pack), 15)
+            self.assertEqual([printing.set.code for printing in pack], ['NEW'] * 15)
+
+    def test_deleted_printing(self):
+        generate_boosters('NEW', 1)
+        deleted = Printing.objects.filter(set__code='NEW', rarity=Printing.Rarity.COMMON).first()
+        deleted.delete()
+        packs = generate_boosters('NEW', 5, rng=random.Random(0))
+        for pack in packs:
+            self.assertEqual(len(pack), 15)
+            self.assertNotIn(deleted.pk, [printing.pk for printing in pack])
+
+    def test_unknown_set(self):
+        with self.assertRaises(ValueError):
+            generate_boosters('XXX')
+
+
+class ParallelImportTests(TestCase):
+
+    def test_import_with_workers(self):
+        sets_data = OrderedDict((code, make_set_data(code, 10)) for code in ['AAA', 'BBB', 'CCC', 'DDD', 'EEE'])
+        sets_data['CCC']['cards'][0]['text'] = 'Trample'
+        parse_data(iter(sets_data.items()), ['AAA', 'CCC', 'DDD', 'EEE'], workers=2)
+
+        self.assertEqual(sorted(Set.objects.values_list('code', flat=True)), ['AAA', 'CCC', 'DDD', 'EEE'])
+        self.assertEqual(Printing.objects.count(), 40)
+        # Sets are applied in order, so the last set's version of a card wins.
+        self.assertEqual(Card.objects.get(name='Card 0').text, 'Flying')
+        self.assertEqual(
+            Set.objects.get(code='CCC').data_hash, normalize_set(('CCC', sets_data['CCC']))['data_hash'])
+
+
+class PerSetTransactionTests(TransactionTestCase):
+
+    def make_sets_data(self):
+        sets_data = OrderedDict((code, make_set_data(code, 5)) for code in ['AAA', 'BBB', 'CCC'])
+        # Printings require an artist.
+        del sets_data['BBB']['cards'][2]['artist']
+        return sets_data
+
+    def import_cards(self, sets_data, **kwargs):
+        with mock.patch('magic_cards.utils.import_cards.stream_data', return_value=iter(sets_data.items())):
+            import_cards(**kwargs)
+
+    def test_single_transaction(self):
+        with self.assertRaises(KeyError):
+            self.import_cards(self.make_sets_data())
+        self.assertFalse(Set.objects.exists())
+
+    def test_resume(self):
+        sets_data = self.make_sets_data()
+        with self.assertRaises(KeyError):
+            self.import_cards(sets_data, per_set_transactions=True)
+        self.assertEqual(list(Set.objects.values_list('code', flat=True)), ['AAA'])
+
+        sets_data['BBB']['cards'][2]['artist'] = 'Artist 2'
+        with mock.patch('magic_cards.utils.import_cards.upsert_cards', wraps=upsert_cards) as upsert:
+            self.import_cards(sets_data, per_set_transactions=True)
+        # The completed set was skipped.
+        self.assertEqual(upsert.call_count, 2)
+        self.assertEqual(sorted(Set.objects.values_list('code', flat=True)), ['AAA', 'BBB', 'CCC'])
+        self.assertEqual(Printing.objects.count(), 15)
+
+
+class SourceTests(TestCase):
+
+    def setUp(self):
+        self.sets_data = StreamingTests.load_fixtures('jackal_pup.json', 'eyes_in_the_skies.json')
+        self.archive = StreamingTests.make_archive(self.sets_data).getvalue()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write_archive(self):
+        path = os.path.join(self.directory, 'AllSets-x.json.zip')
+        with open(path, 'wb') as f:
+            f.write(self.archive)
+        return path
+
+    def make_response(self, status_code=200, content=b'', headers=None):
+        response = mock.Mock(status_code=status_code, headers=headers or {})
+        response.raise_for_status.return_value = None
+        response.iter_content.side_effect = lambda chunk_size: (
+            content[i:i + chunk_size] for i in range(0, len(content), chunk_size))
+        return response
+
+    def test_local_path(self):
+        import_cards(source=self.write_archive())
+        self.assertEqual(sorted(Set.objects.values_list('code', flat=True)), ['RTR', 'TMP'])
+
+    def test_local_file(self):
+        self.assertEqual(fetch_data(LocalSource(io.BytesIO(self.archive))), self.sets_data)
+
+    def test_management_command_file(self):
+        out = StringIO()
+        call_command('import_magic_cards', 'TMP', file=self.write_archive(), stdout=out)
+        self.assertEqual(
+            "Beginning import of 1 set (TMP).\n"
+            "Import complete.\n"
+            "Added 1 new Set, 1 new Card, and 1 new Printing.\n",
+            out.getvalue()
+        )
+
+    @mock.patch('magic_cards.utils.sources.requests.get')
+    def test_cached_download(self, get):
+        source = CachedHTTPSource(os.path.join(self.directory, 'cache'))
+        get.return_value = self.make_response(content=self.archive, headers={'ETag': '"v1"'})
+        self.assertEqual(fetch_data(source), self.sets_data)
+        get.assert_called_once_with(source.url, headers={}, stream=True)
+
+        # The archive has not changed since.
+        get.reset_mock()
+        get.return_value = self.make_response(status_code=304)
+        self.assertEqual(fetch_data(source), self.sets_data)
+        get.assert_called_once_with(source.url, headers={'If-None-Match': '"v1"'}, stream=True)
+
+    @mock.patch('magic_cards.utils.sources.DOWNLOAD_CHUNK_SIZE', 1024)
+    @mock.patch('magic_cards.utils.sources.requests.get')
+    def test_streamed_download(self, get):
+        response = get.return_value = self.make_response(content=self.archive)
+        self.assertEqual(dict(stream_data()), self.sets_data)
+        response.iter_content.assert_called_once_with(chunk_size=1024)
+        response.close.assert_called_once_with()
+
+
+class ImportStatsTests(TestCase):
+
+    def test_phases(self):
+        stats = ImportStats(count_queries=True)
+        with stats.phase('preload'):
+            list(Set.objects.all())
+            with stats.phase('sets') as record:
+                Set.objects.create(code='AAA', name='A')
+                record['rows'] += 1
+            list(Set.objects.all())
+        result = stats.as_dict()
+        self.assertEqual(list(result), PHASES + ['total'])
+        # Nested phases are only counted once.
+        self.assertEqual(result['preload']['queries'], 2)
+        self.assertEqual(result['sets']['queries'], 1)
+        self.assertEqual(result['sets']['rows'], 1)
+        self.assertEqual(result['total']['queries'], 3)
+        self.assertEqual(result['total']['rows'], 1)
+
+    def test_queries_are_not_counted_by_default(self):
+        stats = ImportStats()
+        with stats.phase('preload'):
+            list(Set.objects.all())
+        self.assertEqual(stats.as_dict()['preload']['queries'], 0)
+
+    def test_import_stats(self):
+        sets_data = OrderedDict([('AAA', make_set_data('AAA', 5)), ('BBB', make_set_data('BBB', 3))])
+        with mock.patch('magic_cards.utils.import_cards.stream_data', return_value=iter(sets_data.items())):
+            result = import_cards(stats=ImportStats(count_queries=True))
+        # The cards and artists of BBB are shared with AAA.
+        self.assertEqual(result['cards']['rows'], 5)
+        self.assertEqual(result['printings']['rows'], 13)  # 5 Artists and 8 Printings
+        # 2 new Sets, whose data hashes are then recorded
+        self.assertEqual(result['sets']['rows'], 4)
+        self.assertGreater(result['total']['queries'], 0)
+        self.assertEqual(
+            result['total']['queries'], sum(result[phase]['queries'] for phase in PHASES))
+
+    def test_signals(self):
+        started, finished = mock.Mock(), mock.Mock()
+        import_started.connect(started)
+        self.addCleanup(import_started.disconnect, started)
+        import_finished.connect(finished)
+        self.addCleanup(import_finished.disconnect, finished)
+
+        with mock.patch('magic_cards.utils.import_cards.stream_data', return_value=iter([])):
+            result = import_cards(['AAA'])
+        started.assert_called_once_with(signal=import_started, sender=None, set_codes=['AAA'])
+        finished.assert_called_once_with(signal=import_finished, sender=None, set_codes=['AAA'], stats=result)
+
+    def test_management_command_stats(self):
+        sets_data = StreamingTests.load_fixtures('jackal_pup.json')
+        with tempfile.NamedTemporaryFile(suffix='.zip') as f:
+            f.write(StreamingTests.make_archive(sets_data).getvalue())
+            f.flush()
+            out = StringIO()
+            call_command('import_magic_cards', 'TMP', file=f.name, stdout=out, stats=True)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[2].split(), ['Phase', 'Seconds', 'Queries', 'Rows'])
+        self.assertEqual([line.split()[0] for line in lines[3:-1]], PHASES + ['total'])
+        self.assertEqual(lines[-1], "Added 1 new Set, 1 new Card, and 1 new Printing.")
+
+
+class DiffTests(TestCase):
+
+    def make_changed_data(self):
+        parse_data({'AAA': make_set_data('AAA', 5)}, Everything)
+        sets_data = {'AAA': make_set_data('AAA', 5), 'BBB': make_set_data('BBB', 7)}
+        # Card 0 is the only Goblin left, and becomes an Elf Shaman instead.
+        sets_data['AAA']['cards'][0]['subtypes'] = ['Elf', 'Shaman']
+        sets_data['BBB']['cards'][0]['subtypes'] = ['Elf', 'Shaman']
+        sets_data['AAA']['cards'][3]['subtypes'] = ['Elf', 'Warrior']
+        sets_data['BBB']['cards'][3]['subtypes'] = ['Elf', 'Warrior']
+        sets_data['BBB']['cards'][6]['subtypes'] = ['Elf', 'Warrior']
+        return sets_data
+
+    def counts(self):
+        return {model: model.objects.count() for model in DIFF_MODELS}
+
+    def test_diff(self):
+        sets_data = self.make_changed_data()
+        initial = self.counts()
+        with CaptureQueriesContext(connection) as context:
+            diff = diff_data(sets_data, Everything)
+        self.assertTrue(all(query['sql'].startswith('SELECT') for query in context.captured_queries))
+        self.assertEqual(self.counts(), initial)
+
+        self.assertEqual(diff[Set], {'created': 1, 'updated': 1, 'deleted': 0})
+        self.assertEqual(diff[Card], {'created': 2, 'updated': 2, 'deleted': 0})
+        self.assertEqual(diff[Printing], {'created': 7, 'updated': 0, 'deleted': 0})
+        self.assertEqual(diff[Artist], {'created': 2, 'updated': 0, 'deleted': 0})
+        self.assertEqual(diff[CardSubtype], {'created': 1, 'updated': 0, 'deleted': 1})
+        self.assertEqual(diff[CardType], {'created': 0, 'updated': 0, 'deleted': 0})
+
+        # The import makes the same changes.
+        parse_data(sets_data, Everything)
+        final = self.counts()
+        for model in DIFF_MODELS:
+            self.assertEqual(final[model] - initial[model], diff[model]['created'] - diff[model]['deleted'])
+        self.assertEqual(
+            sorted(CardSubtype.objects.values_list('name', flat=True)), ['Elf', 'Shaman', 'Warrior'])
+
+        # Now there is nothing left to do.
+        diff = diff_data(sets_data, Everything)
+        self.assertTrue(all(not any(counts.values()) for counts in diff.values()))
+
+    def test_management_command_dry_run(self):
+        sets_data = StreamingTests.load_fixtures('jackal_pup.json')
+        with tempfile.NamedTemporaryFile(suffix='.zip') as f:
+            f.write(StreamingTests.make_archive(sets_data).getvalue())
+            f.flush()
+            out = StringIO()
+            call_command('import_magic_cards', file=f.name, stdout=out, dry_run=True)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[:2], ["Beginning dry run of all sets.", "Dry run complete. Nothing was written."])
+        self.assertIn("Set: 1 to create, 0 to update, 0 to delete.", lines)
+        self.assertIn("Printing: 1 to create, 0 to update, 0 to delete.", lines)
+        self.assertFalse(Set.objects.exists())
+
+
+class CardBundleTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        parse_data(OrderedDict([('AAA', make_set_data('AAA', 3)), ('BBB', make_set_data('BBB', 2))]), Everything)
+
+    def test_bundle(self):
+        bundle = get_card_bundle('Card 1')
+        self.assertEqual(bundle['name'], 'Card 1')
+        self.assertEqual(bundle['mana_cost'], '{1}')
+        self.assertEqual(bundle['supertypes'], ['Legendary'])
+        self.assertEqual(sorted(bundle['subtypes']), ['Elf', 'Warrior'])
+        self.assertEqual([printing['set_code'] for printing in bundle['printings']], ['AAA', 'BBB'])
+        self.assertEqual(bundle['printings'][0]['artist'], 'Artist 1')
+        self.assertEqual(bundle['printings'][0]['multiverse_id'], 1001)
+
+    def test_cached_bundle_needs_no_queries(self):
+        with self.assertNumQueries(5):
+            bundle = get_card_bundle('Card 1')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_card_bundle('Card 1'), bundle)
+
+    def test_bundles_query_count_is_constant(self):
+        with self.assertNumQueries(5):
+            bundles = get_card_bundles(['Card 0', 'Card 1', 'Card 2', 'Missing'])
+        self.assertEqual(sorted(bundles), ['Card 0', 'Card 1', 'Card 2'])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_card_bundles(['Card 0', 'Card 1', 'Card 2']), bundles)
+
+    def test_missing_card(self):
+        with self.assertRaises(Card.DoesNotExist):
+            get_card_bundle('Missing')
+
+    def test_bump_version(self):
+        get_card_bundle('Card 1')
+        Card.objects.filter(name='Card 1').update(text='Trample')
+        self.assertEqual(get_card_bundle('Card 1')['text'], 'Flying')
+        bump_cache_version()
+        self.assertEqual(get_card_bundle('Card 1')['text'], 'Trample')
+
+    def test_import_bumps_version(self):
+        get_card_bundle('Card 1')
+        sets_data = {'AAA': make_set_data('AAA', 3, text='Trample')}
+        with mock.patch('magic_cards.utils.import_cards.stream_data', return_value=iter(sets_data.items())):
+            import_cards()
+        self.assertEqual(get_card_bundle('Card 1')['text'], 'Trample')
+
+    def test_version_is_evicted(self):
+        get_card_bundle('Card 1')
+        get_cache().delete('magic_cards:version')
+        bump_cache_version()
+        Card.objects.filter(name='Card 1').update(text='Trample')
+        self.assertEqual(get_card_bundle('Card 1')['text'], 'Trample')
+
+
+class EstimatedCountPaginatorTests(TestCase):
+
+    def setUp(self):
+        for i in range(5):
+            Set.objects.create(name='Set {}'.format(i), code='S{}'.format(i))
+        Set.objects.filter(code='S2').delete()
+
+    def make_paginator(self, queryset, estimate_threshold):
+        paginator = EstimatedCountPaginator(queryset, 2)
+        paginator.estimate_threshold = estimate_threshold
+        return paginator
+
+    def test_estimate(self):
+        paginator = self.make_paginator(Set.objects.order_by('id'), 1)
+        with self.assertNumQueries(1):
+            # The deleted Set is still included in the estimate.
+            self.assertEqual(paginator.count, 5)
+        self.assertEqual(paginator.num_pages, 3)
+
+    def test_small_tables_are_counted(self):
+        self.assertEqual(self.make_paginator(Set.objects.order_by('id'), 100).count, 4)
+
+    def test_filtered_querysets_are_counted(self):
+        self.assertEqual(self.make_paginator(Set.objects.filter(code__gt='S0').order_by('id'), 1).count, 3)
+
+
+class SnapshotTests(TestCase):
+
+    def setUp(self):
+        parse_data(OrderedDict([('AAA', make_set_data('AAA', 6)), ('BBB', make_set_data('BBB', 2))]), Everything)
+
+    def test_of_type_matches_queryset(self):
+        snapshot = Snapshot.from_database()
+        for names in [('Legendary',), ('Creature', 'Goblin'), ('Elf',), ('elf',), ('creature',)]:
+            self.assertEqual(sorted(card.name for card in snapshot.of_type(*names)),
+                             sorted(Card.objects.of_type(*names).values_list('name', flat=True)))
+
+    def check_snapshot(self, snapshot):
+        self.assertEqual(len(snapshot), 6)
+        self.assertIn('Card 1', snapshot)
+        card = snapshot.get('Card 1')
+        self.assertEqual(card.mana_cost, '{1}')
+        self.assertEqual(card.type_line, u'Legendary Creature \u2014 Elf Warrior')
+        self.assertEqual(card.set_codes, ('AAA', 'BBB'))
+        self.assertIsNone(snapshot.get('Missing'))
+
+        self.assertEqual(sorted(card.name for card in snapshot.of_type('Legendary')), ['Card 1', 'Card 3', 'Card 5'])
+        self.assertEqual(sorted(card.name for card in snapshot.of_type('Creature', 'Goblin')), ['Card 0', 'Card 3'])
+        self.assertTrue(snapshot.in_set('Card 1', 'BBB'))
+        self.assertFalse(snapshot.in_set('Card 3', 'BBB'))
+        self.assertFalse(snapshot.in_set('Card 1', 'CCC'))
+        self.assertEqual([card.name for card in snapshot.set_cards('BBB')], ['Card 0', 'Card 1'])
+
+        # Equal strings are shared.
+        self.assertIs(snapshot.get('Card 0').set_codes[0], snapshot.get('Card 1').set_codes[0])
+        self.assertIs(snapshot.get('Card 1').type_line, snapshot.get('Card 5').type_line)
+
+    def test_snapshot(self):
+        with self.assertNumQueries(3):
+            snapshot = Snapshot.from_database()
+        with self.assertNumQueries(0):
+            self.check_snapshot(snapshot)
+
+    def test_dump_and_load(self):
+        f = io.BytesIO()
+        Snapshot.from_database().dump(f)
+        f.seek(0)
+        with self.assertNumQueries(0):
+            self.check_snapshot(Snapshot.load(f))
+
+    def test_dump_to_path(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'cards.snapshot')
+        Snapshot.from_database().dump(path)
+        self.check_snapshot(Snapshot.load(path))
+
+
+class CatalogueTests(TestCase):
+
+    def setUp(self):
+        sets_data = OrderedDict([('AAA', make_set_data('AAA', 4)), ('BBB', make_set_data('BBB', 2))])
+        sets_data['AAA']['cards'][2]['name'] = u'S\xe9ance'
+        sets_data['AAA']['cards'][3]['loyalty'] = 3
+        del sets_data['BBB']['cards'][1]['multiverseid']
+        parse_data(sets_data, Everything)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'cards.bin')
+
+    def test_dump_and_read(self):
+        self.assertEqual(dump_catalogue(self.path), (4, 6))
+        seance_id = Card.objects.get(name=u'S\xe9ance').id
+        with self.assertNumQueries(0), CatalogueReader(self.path) as reader:
+            self.assertEqual(len(reader), 4)
+            self.assertEqual([card.name for card in reader.cards()], ['Card 0', 'Card 1', 'Card 3', u'S\xe9ance'])
+
+            card = reader.find_card('Card 1')
+            self.assertEqual(card.mana_cost, '{1}')
+            self.assertEqual(card.type_line, u'Legendary Creature \u2014 Elf Warrior')
+            self.assertIsNone(card.loyalty)
+            self.assertEqual(reader.find_card('Card 3').loyalty, 3)
+            self.assertEqual(reader.find_card(u'S\xe9ance').id, seance_id)
+            self.assertIsNone(reader.find_card('Card 2'))
+
+            printings = reader.printings_of(card.id)
+            self.assertEqual([(printing.set_code, printing.multiverse_id) for printing in printings],
+                             [('AAA', 1001), ('BBB', None)])
+            self.assertEqual(printings[0].artist, 'Artist 1')
+            self.assertEqual(printings[0].rarity, Printing.Rarity.COMMON)
+            self.assertEqual(reader.printings_of(0), [])
+
+    def test_management_command(self):
+        out = StringIO()
+        call_command('dump_magic_cards', self.path, stdout=out)
+        self.assertEqual(out.getvalue(), "Wrote 4 cards and 6 printings to {}.\n".format(self.path))
+        with CatalogueReader(self.path) as reader:
+            self.assertEqual(reader.find_card('Card 0').name, 'Card 0')
+
+    def test_not_a_catalogue(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'\0' * 64)
+        with self.assertRaises(ValueError):
+            CatalogueReader(self.path)